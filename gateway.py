@@ -0,0 +1,382 @@
+# Fleet gateway for several rovers. Keeps a persistent connection to each
+# rover.py instance, subscribes to their telemetry streams for a combined
+# view and forwards commands through a per-rover queue. Commands sent to the
+# whole fleet, such as "stop", fan out to every rover at once.
+#
+#   python gateway.py --rover alpha=http://10.0.0.21:5000 --rover beta=http://10.0.0.22:5000
+#   python gateway.py --simulate 3   # spawn three simulated rovers locally
+import argparse
+import http.client
+import json
+import os
+import queue
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from concurrent.futures import Future, CancelledError, wait
+from flask import Flask, Response, jsonify, render_template_string
+from simulated_hardware import wait_until_up
+
+QUEUE_DEPTH = 32  # Pending commands per rover before new ones are refused
+COMMAND_TIMEOUT = 5.0  # Seconds a caller waits for a rover to answer
+TELEMETRY_MAX_HZ = 5  # Rate requested from each rover's telemetry stream
+RECONNECT_DELAY = (0.5, 10.0)  # Telemetry reconnect backoff bounds (s)
+URGENT_COMMANDS = ('stop',)  # Jump the queue and drop pending commands
+SIMULATED_BASE_PORT = 5001
+
+app = Flask(__name__)
+rovers = {}
+
+# --------------------- Rover Connections ---------------------
+# Werkzeug's threaded server speaks HTTP/1.1, so the connection is kept alive
+# between commands instead of reconnecting for every one. Each rover's commands
+# are sent one at a time to keep them in order, so one connection is enough
+class KeepAliveConnection:
+    def __init__(self, url):
+        parts = urllib.parse.urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.conn = None
+
+    def get(self, path):
+        reused = self.conn is not None
+        if not reused:
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=COMMAND_TIMEOUT)
+        try:
+            status, body, keep = self._send(path)
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            # The rover closed the idle connection; retry once on a new one
+            if not reused:
+                raise
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=COMMAND_TIMEOUT)
+            status, body, keep = self._send(path)
+        if not keep:
+            self.close()
+        return status, body
+
+    def _send(self, path):
+        try:
+            self.conn.request('GET', path)
+            response = self.conn.getresponse()
+            body = response.read()
+        except (http.client.HTTPException, OSError):
+            self.close()
+            raise
+        return response.status, body, not response.will_close
+
+    def close(self):
+        conn, self.conn = self.conn, None
+        if conn is not None:
+            conn.close()
+
+# --------------------- Rover Links ---------------------
+class RoverLink:
+    def __init__(self, name, url):
+        self.name = name
+        self.url = url.rstrip('/')
+        self.connection = KeepAliveConnection(self.url)
+        self.commands = queue.Queue(maxsize=QUEUE_DEPTH)
+        self.telemetry = None
+        self.telemetry_at = None
+        self.online = False
+        self.error = None
+
+    def start(self):
+        threading.Thread(target=self.command_worker, name=f"commands-{self.name}", daemon=True).start()
+        threading.Thread(target=self.telemetry_listener, name=f"telemetry-{self.name}", daemon=True).start()
+
+    # Urgent commands cancel everything still queued, so a stop is never
+    # followed by a stale drive command
+    def submit(self, command):
+        if command in URGENT_COMMANDS:
+            while True:
+                try:
+                    _, pending = self.commands.get_nowait()
+                except queue.Empty:
+                    break
+                pending.cancel()
+        future = Future()
+        self.commands.put_nowait((command, future))
+        return future
+
+    # One worker per rover keeps its commands in order
+    def command_worker(self):
+        while True:
+            command, future = self.commands.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(self.connection.get(f"/control/{urllib.parse.quote(command)}"))
+            except Exception as e:
+                future.set_exception(e)
+
+    # Long-lived subscription to the rover's server-sent telemetry
+    def telemetry_listener(self):
+        delay = RECONNECT_DELAY[0]
+        while True:
+            conn = http.client.HTTPConnection(self.connection.host, self.connection.port, timeout=30)
+            try:
+                conn.request('GET', f"/telemetry/stream?max_hz={TELEMETRY_MAX_HZ}")
+                response = conn.getresponse()
+                if response.status != 200:
+                    raise http.client.HTTPException(f"telemetry stream returned {response.status}")
+                while True:
+                    line = response.readline()
+                    if not line:
+                        raise ConnectionError('telemetry stream closed')
+                    if line.startswith(b'data:'):
+                        self.telemetry = json.loads(line[5:])
+                        self.telemetry_at = time.time()
+                        self.online = True
+                        self.error = None
+                        delay = RECONNECT_DELAY[0]
+            except (http.client.HTTPException, OSError, ValueError) as e:
+                self.online = False
+                self.error = str(e)
+            finally:
+                conn.close()
+            time.sleep(delay)
+            delay = min(delay * 2, RECONNECT_DELAY[1])
+
+    def status(self):
+        return {
+            'url': self.url,
+            'online': self.online,
+            'error': self.error,
+            'age_s': round(time.time() - self.telemetry_at, 2) if self.telemetry_at else None,
+            'queued': self.commands.qsize(),
+            'telemetry': self.telemetry
+        }
+
+def command_result(future):
+    try:
+        status, body = future.result(timeout=0)
+    except CancelledError:
+        return 409, {'status': 'error', 'message': 'superseded by stop'}
+    except Exception as e:
+        return 502, {'status': 'error', 'message': str(e)}
+    try:
+        return status, json.loads(body)
+    except ValueError:
+        return status, {'status': 'error', 'message': body.decode(errors='replace')}
+
+# --------------------- Gateway Routes ---------------------
+@app.route('/')
+def index():
+    return render_template_string(GATEWAY_HTML)
+
+@app.route('/fleet/status', methods=['GET'])
+def fleet_status():
+    return jsonify({name: link.status() for name, link in rovers.items()})
+
+@app.route('/rover/<name>/control/<command>', methods=['GET'])
+def rover_control(name, command):
+    link = rovers.get(name)
+    if link is None:
+        return jsonify({'status': 'error', 'message': f"unknown rover '{name}'"}), 404
+    try:
+        future = link.submit(command)
+    except queue.Full:
+        return jsonify({'status': 'error', 'message': f"command queue for '{name}' is full"}), 503
+    wait([future], timeout=COMMAND_TIMEOUT)
+    if not future.done():
+        # Never send a command the caller was told had failed
+        future.cancel()
+        return jsonify({'status': 'error', 'message': f"'{name}' did not answer in time"}), 504
+    status, body = command_result(future)
+    return Response(json.dumps(body), status=status, mimetype='application/json')
+
+# Broadcast, e.g. /fleet/control/stop; every rover worker sends in parallel
+@app.route('/fleet/control/<command>', methods=['GET'])
+def fleet_control(command):
+    futures = {}
+    results = {}
+    for name, link in rovers.items():
+        try:
+            futures[name] = link.submit(command)
+        except queue.Full:
+            results[name] = {'status': 503, 'response': {'status': 'error', 'message': 'command queue is full'}}
+    wait(list(futures.values()), timeout=COMMAND_TIMEOUT)
+    for name, future in futures.items():
+        if future.done():
+            status, body = command_result(future)
+            results[name] = {'status': status, 'response': body}
+        else:
+            future.cancel()
+            results[name] = {'status': 504, 'response': {'status': 'error', 'message': 'no answer in time'}}
+    ok = all(r['status'] < 400 for r in results.values())
+    return jsonify({'status': 'success' if ok else 'partial', 'command': command, 'rovers': results})
+
+GATEWAY_HTML = """
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Rover Fleet</title>
+    <style>
+        body {
+            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+            max-width: 1200px;
+            margin: 0 auto;
+            padding: 20px;
+            color: #333333;
+        }
+
+        h1 {
+            color: #3498db;
+            margin-bottom: 20px;
+        }
+
+        table {
+            width: 100%;
+            border-collapse: collapse;
+        }
+
+        th, td {
+            padding: 10px;
+            border-bottom: 1px solid #eee;
+            text-align: left;
+        }
+
+        tr.offline {
+            color: #999;
+        }
+
+        tr.alert {
+            background-color: #ffdddd;
+        }
+
+        .stop-button {
+            background-color: #e74c3c;
+            color: white;
+            border: none;
+            padding: 15px;
+            font-size: 18px;
+            border-radius: 10px;
+            cursor: pointer;
+            width: 100%;
+            margin-top: 20px;
+        }
+    </style>
+</head>
+<body>
+    <h1>Rover Fleet</h1>
+    <table>
+        <thead>
+            <tr><th>Rover</th><th>Link</th><th>Anomaly</th><th>Peak</th><th>Base</th><th>Elbow</th><th>Gripper</th><th>Queued</th></tr>
+        </thead>
+        <tbody id="fleet"></tbody>
+    </table>
+    <button class="stop-button" onclick="stopAll()">STOP ALL ROVERS</button>
+
+    <script>
+        function renderFleet(fleet) {
+            const rows = Object.entries(fleet).map(([name, rover]) => {
+                const t = rover.telemetry || {};
+                const p = t.positions || {};
+                const cls = !rover.online ? 'offline' : (t.anomaly_detected ? 'alert' : '');
+                return `<tr class="${cls}"><td>${name}</td><td>${rover.online ? 'online' : 'offline'}</td>` +
+                    `<td>${t.anomaly_detected ? 'YES' : 'no'}</td><td>${t.peak_magnitude ?? '-'}</td>` +
+                    `<td>${p.base ?? '-'}°</td><td>${p.elbow ?? '-'}°</td><td>${p.gripper ?? '-'}°</td>` +
+                    `<td>${rover.queued}</td></tr>`;
+            });
+            document.getElementById("fleet").innerHTML = rows.join('');
+        }
+
+        function refresh() {
+            fetch('/fleet/status')
+                .then(response => response.json())
+                .then(renderFleet)
+                .catch(error => console.error('Error fetching fleet status:', error));
+        }
+
+        function stopAll() {
+            fetch('/fleet/control/stop')
+                .then(response => response.json())
+                .then(data => console.log(data))
+                .catch(error => console.error('Error:', error));
+        }
+
+        setInterval(refresh, 1000);
+        refresh();
+    </script>
+</body>
+</html>
+"""
+
+# --------------------- Simulated Fleet ---------------------
+# Runs rover.py on simulated hardware, one process per rover, each with its own
+# history database inside history_dir
+def spawn_simulated_rovers(count, base_port, history_dir):
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rover.py')
+    processes = []
+    targets = {}
+    for i in range(count):
+        port = base_port + i
+        history_db = os.path.join(history_dir, f"sim{i + 1}.db")
+        env = dict(os.environ, ROVER_SIMULATE='1', ROVER_PORT=str(port), ROVER_HISTORY_DB=history_db)
+        processes.append(subprocess.Popen(
+            [sys.executable, script], env=env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        ))
+        targets[f"sim{i + 1}"] = f"http://127.0.0.1:{port}"
+    for name, url in targets.items():
+        if not wait_until_up(url):
+            print(f"[FLEET] {name} did not come up at {url}")
+    return processes, targets
+
+def parse_rover(text):
+    name, sep, url = text.partition('=')
+    if not sep or not name or not url.startswith('http'):
+        raise argparse.ArgumentTypeError('expected NAME=http://HOST:PORT')
+    return name, url
+
+def main():
+    parser = argparse.ArgumentParser(description='Gateway for a fleet of rover.py instances.')
+    parser.add_argument('--rover', type=parse_rover, action='append', default=[], metavar='NAME=URL',
+                        help='rover to manage, repeat for each rover')
+    parser.add_argument('--simulate', type=int, default=0, metavar='N',
+                        help='spawn N simulated rovers on local ports')
+    parser.add_argument('--simulate-port', type=int, default=SIMULATED_BASE_PORT,
+                        help='first port for simulated rovers')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args()
+
+    processes = []
+    history_dir = None
+    targets = dict(args.rover)
+    if args.simulate:
+        history_dir = tempfile.mkdtemp(prefix='rover_fleet_')
+        processes, simulated = spawn_simulated_rovers(args.simulate, args.simulate_port, history_dir)
+        targets.update(simulated)
+    if not targets:
+        parser.error('no rovers given, use --rover or --simulate')
+
+    for name, url in targets.items():
+        rovers[name] = RoverLink(name, url)
+        rovers[name].start()
+        print(f"[FLEET] {name} -> {url}")
+
+    # Turn SIGTERM into a normal exit so simulated rovers are shut down too
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        app.run(host=args.host, port=args.port, debug=False, threaded=True)
+    finally:
+        for link in rovers.values():
+            link.connection.close()
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+        if history_dir:
+            shutil.rmtree(history_dir, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,289 @@
+# HTTP load generator for the rover control server. Virtual operators replay the
+# traffic the control page produces (held keys, speed slider bursts and the
+# anomaly poll) against rover.py running on simulated hardware, then report
+# throughput, latency percentiles and server thread counts per serving mode.
+#
+#   python loadtest.py --clients 20 --duration 30
+#   python loadtest.py --url http://rover.local:5000   # an already running server
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+from simulated_hardware import wait_until_up
+
+# Timings taken from the control page script
+KEY_REPEAT = 0.2  # startCommand() resend interval (s)
+POLL_INTERVAL = 1.0  # /check_anomaly poll (s)
+SLIDER_STEP = 0.016  # oninput events while dragging, about one per frame (s)
+HOLD_TIME = (0.4, 3.0)  # How long an operator holds a key (s)
+THINK_TIME = (0.2, 1.5)  # Pause between operator actions (s)
+
+DRIVE_KEYS = ['w', 'a', 's', 'd']
+ARM_KEYS = ['i', 'k', 'j', 'l', 'o', 'c']  # Same as rover.ARM_COMMANDS
+DEFAULT_MIX = 'drive=5,arm=3,slider=2'
+PERCENTILES = (50, 95, 99)
+
+# --------------------- Serving Modes ---------------------
+# Each mode starts rover.py in its own process on simulated hardware, so the
+# load generator never competes with the server for the GIL, and returns
+# (base_url, pid, stop). Register new serving setups here so they can be
+# compared side by side with --modes
+ROVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rover.py')
+
+def free_port(host):
+    with socket.socket() as s:
+        s.bind((host, 0))
+        return s.getsockname()[1]
+
+def start_rover(host, command):
+    port = free_port(host)
+    # Simulated history goes to a scratch database that is removed with the server
+    history_dir = tempfile.TemporaryDirectory(prefix='rover_loadtest_')
+    history_db = os.path.join(history_dir.name, 'history.db')
+    process = subprocess.Popen(
+        command, env=dict(os.environ, ROVER_SIMULATE='1', ROVER_PORT=str(port), ROVER_HISTORY_DB=history_db),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+    def stop():
+        process.terminate()
+        process.wait()
+        history_dir.cleanup()
+
+    url = f"http://{host}:{port}"
+    if not wait_until_up(url):
+        stop()
+        raise RuntimeError(f"rover did not come up at {url}")
+    return url, process.pid, stop
+
+def serve_dev(host):
+    # The threaded Werkzeug server behind app.run()
+    return start_rover(host, [sys.executable, ROVER_SCRIPT])
+
+SERVING_MODES = {
+    'dev': serve_dev
+}
+
+# --------------------- Virtual Clients ---------------------
+class Results:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, kind, seconds, ok):
+        self.latencies.setdefault(kind, []).append(seconds)
+        if not ok:
+            self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    def merge(self, other):
+        for kind, values in other.latencies.items():
+            self.latencies.setdefault(kind, []).extend(values)
+        for kind, count in other.errors.items():
+            self.errors[kind] = self.errors.get(kind, 0) + count
+
+class Connection:
+    def __init__(self, url, results):
+        parts = urllib.parse.urlsplit(url)
+        self.conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=10)
+        self.results = results
+
+    def get(self, kind, path):
+        start = time.perf_counter()
+        ok = False
+        try:
+            self.conn.request('GET', path)
+            response = self.conn.getresponse()
+            response.read()
+            ok = response.status < 400
+        except (http.client.HTTPException, OSError):
+            self.conn.close()
+        self.results.record(kind, time.perf_counter() - start, ok)
+
+def sleep_until(deadline, seconds):
+    time.sleep(max(0.0, min(seconds, deadline - time.perf_counter())))
+
+# Repeats a command every KEY_REPEAT like a held button, then releases it
+def hold_key(conn, rng, deadline, kind, keys, release=None):
+    command = rng.choice(keys)
+    release_at = min(deadline, time.perf_counter() + rng.uniform(*HOLD_TIME))
+    while time.perf_counter() < release_at:
+        sent = time.perf_counter()
+        conn.get(kind, f"/control/{command}")
+        sleep_until(release_at, KEY_REPEAT - (time.perf_counter() - sent))
+    if release:
+        conn.get(kind, f"/control/{release}")
+
+def drive(conn, rng, deadline):
+    hold_key(conn, rng, deadline, 'drive', DRIVE_KEYS, release='stop')
+
+def arm(conn, rng, deadline):
+    hold_key(conn, rng, deadline, 'arm', ARM_KEYS)
+
+def slider(conn, rng, deadline):
+    value = rng.randint(0, 100)
+    target = rng.randint(0, 100)
+    step = 1 if target > value else -1
+    for speed in range(value, target + step, step * rng.randint(2, 6)):
+        if time.perf_counter() >= deadline:
+            break
+        conn.get('slider', f"/control/speed-{speed}")
+        time.sleep(SLIDER_STEP)
+
+SCENARIOS = {
+    'drive': drive,
+    'arm': arm,
+    'slider': slider
+}
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(','):
+        name, _, weight = item.partition('=')
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"unknown scenario '{name}', choose from {', '.join(SCENARIOS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+def operator(url, mix, seed, deadline, results):
+    rng = random.Random(seed)
+    conn = Connection(url, results)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    while time.perf_counter() < deadline:
+        SCENARIOS[rng.choices(names, weights)[0]](conn, rng, deadline)
+        sleep_until(deadline, rng.uniform(*THINK_TIME))
+
+def poller(url, deadline, results):
+    conn = Connection(url, results)
+    while time.perf_counter() < deadline:
+        sent = time.perf_counter()
+        conn.get('poll', '/check_anomaly')
+        sleep_until(deadline, POLL_INTERVAL - (time.perf_counter() - sent))
+
+# Thread count of the server process, or None where /proc is not available
+def server_thread_count(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith('Threads:'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+
+def run_load(url, clients, duration, mix, seed, server_pid=None):
+    deadline = time.perf_counter() + duration
+    per_thread = []
+    threads = []
+    for i in range(clients):
+        for target, args in ((operator, (url, mix, seed + i, deadline)), (poller, (url, deadline))):
+            results = Results()
+            per_thread.append(results)
+            threads.append(threading.Thread(target=target, args=args + (results,), name=f"loadtest-{i}", daemon=True))
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    samples = []
+    while any(thread.is_alive() for thread in threads):
+        if server_pid is not None:
+            count = server_thread_count(server_pid)
+            if count is not None:
+                samples.append(count)
+        time.sleep(0.1)
+    elapsed = time.perf_counter() - start
+
+    results = Results()
+    for partial in per_thread:
+        results.merge(partial)
+    return summarize(results, elapsed, samples)
+
+# --------------------- Reporting ---------------------
+def percentile(sorted_values, q):
+    index = min(len(sorted_values) - 1, int(round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def latency_summary(values, errors):
+    values = sorted(values)
+    summary = {'requests': len(values), 'errors': errors}
+    for q in PERCENTILES:
+        summary[f"p{q}_ms"] = round(percentile(values, q) * 1000, 2)
+    summary['max_ms'] = round(values[-1] * 1000, 2)
+    return summary
+
+def summarize(results, elapsed, thread_samples):
+    everything = [v for values in results.latencies.values() for v in values]
+    report = {
+        'elapsed_s': round(elapsed, 2),
+        'throughput_rps': round(len(everything) / elapsed, 1),
+        'total': latency_summary(everything, sum(results.errors.values())) if everything else None,
+        'by_kind': {
+            kind: latency_summary(values, results.errors.get(kind, 0))
+            for kind, values in sorted(results.latencies.items())
+        }
+    }
+    if thread_samples:
+        report['server_threads'] = {
+            'peak': max(thread_samples),
+            'mean': round(sum(thread_samples) / len(thread_samples), 1)
+        }
+    return report
+
+def print_report(reports):
+    columns = ('requests', 'errors') + tuple(f"p{q}_ms" for q in PERCENTILES) + ('max_ms',)
+    header = f"{'mode':<10} {'kind':<8}" + ''.join(f"{c:>10}" for c in columns)
+    print(header)
+    print('-' * len(header))
+    for mode, report in reports.items():
+        rows = dict(report['by_kind'])
+        if report['total']:
+            rows['total'] = report['total']
+        for kind, row in rows.items():
+            print(f"{mode:<10} {kind:<8}" + ''.join(f"{row[c]:>10}" for c in columns))
+        threads = report.get('server_threads')
+        threads_text = f", server threads peak {threads['peak']} mean {threads['mean']}" if threads else ''
+        print(f"{mode:<10} throughput {report['throughput_rps']} req/s over {report['elapsed_s']} s{threads_text}")
+        print()
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the rover control server on simulated hardware.')
+    parser.add_argument('--clients', type=int, default=10, help='virtual operators, each with its own anomaly poller')
+    parser.add_argument('--duration', type=float, default=20, help='seconds per serving mode')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"scenario weights, default {DEFAULT_MIX}")
+    parser.add_argument('--modes', nargs='+', choices=sorted(SERVING_MODES), default=['dev'],
+                        help='serving modes to start locally and compare')
+    parser.add_argument('--url', help='also load an already running server at this base URL')
+    parser.add_argument('--host', default='127.0.0.1', help='address the locally started servers are reached at')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='write the full report to this file')
+    args = parser.parse_args()
+
+    reports = {}
+    for mode in args.modes:
+        url, pid, stop = SERVING_MODES[mode](args.host)
+        try:
+            print(f"[LOAD] {mode}: {args.clients} clients for {args.duration:g}s against {url}")
+            reports[mode] = run_load(url, args.clients, args.duration, args.mix, args.seed, server_pid=pid)
+        finally:
+            stop()
+    if args.url:
+        print(f"[LOAD] url: {args.clients} clients for {args.duration:g}s against {args.url}")
+        reports['url'] = run_load(args.url, args.clients, args.duration, args.mix, args.seed)
+
+    print()
+    print_report(reports)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(reports, f, indent=2)
+
+if __name__ == '__main__':
+    main()
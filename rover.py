@@ -1,23 +1,345 @@
 import time
-import RPi.GPIO as GPIO
-from board import SCL, SDA
-import busio
-from adafruit_pca9685 import PCA9685
-from adafruit_motor import servo
-from flask import Flask, render_template_string, jsonify
+import os
+import sys
+import functools
+import collections
+import gc
+import itertools
+import json
+import math
+import re
+import sqlite3
+import struct
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, render_template_string, jsonify, request, g
 import threading
-import spidev
 import numpy as np
 
 # Create Flask app
-app = Flask(_name_)
+app = Flask(__name__)
+
+# --------------------- Debug Tracing Setup ---------------------
+# Spans and profiler samples are buffered in memory and exported as Chrome-trace
+# JSON from /debug/trace (open it in chrome://tracing or ui.perfetto.dev)
+TRACE_MAX_EVENTS = 100000
+PROFILE_INTERVAL = 0.005  # Sampling profiler period (s)
+PROFILE_MAX_SECONDS = 60
+
+trace_enabled = False
+trace_events = collections.deque(maxlen=TRACE_MAX_EVENTS)
+profiler_thread = None
+profiler_stop = threading.Event()
+
+def _trace_ts(seconds):
+    # Chrome trace timestamps are in microseconds
+    return seconds * 1e6
+
+def record_span(name, start, end, args=None, cat='span', tid=None):
+    trace_events.append({
+        'name': name,
+        'cat': cat,
+        'ph': 'X',
+        'ts': _trace_ts(start),
+        'dur': _trace_ts(end - start),
+        'pid': os.getpid(),
+        'tid': tid if tid is not None else threading.get_ident(),
+        'args': args or {}
+    })
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+class _Span:
+    __slots__ = ('name', 'args', 'start')
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record_span(self.name, self.start, time.perf_counter(), self.args)
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+# Disabled tracing costs one global lookup and returns a shared no-op object
+def trace_span(name, args=None):
+    if not trace_enabled:
+        return _NULL_SPAN
+    return _Span(name, args)
+
+# Decorator recording a span named "<category>.<function>" for each call
+def traced(category):
+    def decorator(func):
+        name = f"{category}.{func.__name__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not trace_enabled:
+                return func(*args, **kwargs)
+            with _Span(name, None):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+# Sampling profiler: snapshots every thread's stack and merges consecutive
+# identical frames into Chrome-trace slices, giving a per-thread flame chart
+def profile_sampler(duration):
+    own_tid = threading.get_ident()
+    open_frames = {}  # tid -> [(label, start), ...] ordered root first
+    deadline = time.perf_counter() + duration
+
+    def close_frames(tid, depth, now):
+        stack = open_frames[tid]
+        while len(stack) > depth:
+            label, start = stack.pop()
+            record_span(label, start, now, cat='sample', tid=tid)
+
+    while not profiler_stop.is_set() and time.perf_counter() < deadline:
+        now = time.perf_counter()
+        frames = sys._current_frames()
+        for tid, frame in frames.items():
+            if tid == own_tid:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(_frame_label(frame))
+                frame = frame.f_back
+            labels.reverse()
+
+            stack = open_frames.setdefault(tid, [])
+            common = 0
+            while common < len(stack) and common < len(labels) and stack[common][0] == labels[common]:
+                common += 1
+            close_frames(tid, common, now)
+            stack.extend((label, now) for label in labels[common:])
+
+        # Threads that exited since the last sample
+        for tid in [t for t in open_frames if t not in frames]:
+            close_frames(tid, 0, now)
+            del open_frames[tid]
+
+        profiler_stop.wait(PROFILE_INTERVAL)
+
+    now = time.perf_counter()
+    for tid in list(open_frames):
+        close_frames(tid, 0, now)
+
+def export_chrome_trace():
+    pid = os.getpid()
+    metadata = [{
+        'name': 'thread_name',
+        'ph': 'M',
+        'pid': pid,
+        'tid': thread.ident,
+        'args': {'name': thread.name}
+    } for thread in threading.enumerate()]
+    return {'traceEvents': metadata + list(trace_events), 'displayTimeUnit': 'ms'}
+
+# --------------------- Real-time Profile ---------------------
+# Opt in with ROVER_REALTIME=1. The sampler and motion loops then run on their
+# own threads with SCHED_FIFO priority (or a lower nice value when that is not
+# permitted) pinned to dedicated cores, Flask threads are kept off those cores
+# and the garbage collector is frozen and relaxed once startup has finished.
+# Deadline and GC pause accounting is always on and reported at /status/realtime
+REALTIME = os.environ.get('ROVER_REALTIME') == '1'
+REALTIME_PRIORITIES = {'pwm': 70, 'sampler': 60, 'motion': 50, 'playback': 50}  # SCHED_FIFO, 1-99
+REALTIME_NICE = -10  # Fallback when SCHED_FIFO is refused
+REALTIME_GC_THRESHOLD = (50000, 50, 100)  # Generation thresholds after the freeze
+DEADLINE_SLACK = 0.002  # Seconds late before a loop tick counts as missed
+
+# With three or more cores the last one samples, the one before it moves the
+# servos (and hosts the software PWM threads), and everything else gets the rest.
+# Macro playback takes a third core when there are four or more; otherwise it
+# shares the motion core, which is idle while a macro plays
+if hasattr(os, 'sched_getaffinity') and len(os.sched_getaffinity(0)) >= 3:
+    _cpus = sorted(os.sched_getaffinity(0))
+    _reserved = 3 if len(_cpus) >= 4 else 2
+    REALTIME_CPUS = {
+        'sampler': {_cpus[-1]},
+        'motion': {_cpus[-2]},
+        'pwm': {_cpus[-2]},
+        'playback': {_cpus[-_reserved]},
+        'default': set(_cpus[:-_reserved])
+    }
+else:
+    REALTIME_CPUS = {}
+
+class LoopStats:
+    __slots__ = ('ticks', 'missed', 'worst_late')
+
+    def __init__(self):
+        self.ticks = 0
+        self.missed = 0
+        self.worst_late = 0.0
+
+    def tick(self, lateness):
+        self.ticks += 1
+        if lateness > DEADLINE_SLACK:
+            self.missed += 1
+        if lateness > self.worst_late:
+            self.worst_late = lateness
+
+    def report(self):
+        return {
+            'ticks': self.ticks,
+            'missed': self.missed,
+            'worst_late_ms': round(self.worst_late * 1000, 3)
+        }
+
+loop_stats = {'sampler': LoopStats(), 'motion': LoopStats(), 'playback': LoopStats()}
+realtime_threads = {}
+motion_executor = None
+motion_local = threading.local()
+
+gc_stats = {'collections': 0, 'max_pause_ms': 0.0, 'total_pause_ms': 0.0, 'frozen': 0}
+gc_pause_start = 0.0
+
+def gc_monitor(phase, info):
+    global gc_pause_start
+    if phase == 'start':
+        gc_pause_start = time.perf_counter()
+        return
+    pause = (time.perf_counter() - gc_pause_start) * 1000
+    gc_stats['collections'] += 1
+    gc_stats['total_pause_ms'] = round(gc_stats['total_pause_ms'] + pause, 3)
+    if pause > gc_stats['max_pause_ms']:
+        gc_stats['max_pause_ms'] = round(pause, 3)
+
+gc.callbacks.append(gc_monitor)
+
+# Applies to the calling thread only: on Linux, pid 0 means the current thread
+def apply_realtime(role):
+    applied = {'thread': threading.current_thread().name}
+    cpus = REALTIME_CPUS.get(role)
+    if cpus:
+        try:
+            os.sched_setaffinity(0, cpus)
+            applied['cpus'] = sorted(cpus)
+        except OSError as e:
+            applied['cpus_error'] = str(e)
+    priority = REALTIME_PRIORITIES.get(role)
+    if priority is not None:
+        try:
+            os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+            applied['policy'] = f"SCHED_FIFO {priority}"
+        except (OSError, AttributeError):
+            try:
+                os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), REALTIME_NICE)
+                applied['policy'] = f"nice {REALTIME_NICE}"
+            except (OSError, AttributeError) as e:
+                applied['policy'] = 'default'
+                applied['policy_error'] = str(e)
+    realtime_threads[role] = applied
+    print(f"[RT] {role}: {applied}")
+
+def restore_default_scheduling():
+    try:
+        os.sched_setscheduler(0, os.SCHED_OTHER, os.sched_param(0))
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 0)
+    except (OSError, AttributeError):
+        pass
+    if REALTIME_CPUS:
+        os.sched_setaffinity(0, REALTIME_CPUS['default'])
+
+def enter_motion_thread():
+    motion_local.active = True
+    apply_realtime('motion')
+
+# Call from the main thread before any worker threads start so they inherit
+# the non-real-time cores
+def start_realtime_profile():
+    global motion_executor
+    if REALTIME_CPUS:
+        os.sched_setaffinity(0, REALTIME_CPUS['default'])
+    motion_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='motion', initializer=enter_motion_thread)
+
+# Steady state: move startup objects out of the collector's reach and make
+# collections rarer so they stop landing inside control loops
+def settle_gc():
+    gc.collect()
+    gc.freeze()
+    gc.set_threshold(*REALTIME_GC_THRESHOLD)
+    gc_stats['frozen'] = gc.get_freeze_count()
+
+def realtime_report():
+    return {
+        'enabled': REALTIME,
+        'threads': realtime_threads,
+        'loops': {name: stats.report() for name, stats in loop_stats.items()},
+        'gc': dict(gc_stats, threshold=gc.get_threshold())
+    }
+
+# --------------------- Lazy Hardware Handles ---------------------
+# Hardware drivers are imported and opened on first use, so importing this module
+# for its constants or HTML never touches the buses and a missing device only
+# fails the code paths that need it. ROVER_SIMULATE=1 swaps in the drivers from
+# simulated_hardware.py for running without a Pi
+SIMULATE_HARDWARE = os.environ.get('ROVER_SIMULATE') == '1'
+
+class DeviceUnavailable(RuntimeError):
+    pass
+
+class LazyDevice:
+    def __init__(self, name, factory):
+        object.__setattr__(self, '_name', name)
+        object.__setattr__(self, '_factory', factory)
+        object.__setattr__(self, '_lock', threading.Lock())
+        object.__setattr__(self, '_device', None)
+        object.__setattr__(self, '_error', None)
+
+    def resolve(self):
+        device = self._device
+        if device is not None:
+            return device
+        # Callers arriving while another thread initializes the device wait here
+        with self._lock:
+            if self._device is None:
+                if self._error is not None:
+                    raise DeviceUnavailable(f"{self._name} unavailable: {self._error}")
+                try:
+                    object.__setattr__(self, '_device', self._factory())
+                except Exception as e:
+                    object.__setattr__(self, '_error', e)
+                    raise DeviceUnavailable(f"{self._name} unavailable: {e}") from e
+            return self._device
+
+    def is_ready(self):
+        return self._device is not None
+
+    def __getattr__(self, attr):
+        return getattr(self.resolve(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self.resolve(), attr, value)
 
 # --------------------- Vibration Analysis Setup ---------------------
 # SPI Setup
-spi = spidev.SpiDev()
-spi.open(0, 0)
-spi.max_speed_hz = 5000000
-spi.mode = 0b11
+def init_spi():
+    if SIMULATE_HARDWARE:
+        from simulated_hardware import SimulatedSpiDev as SpiDev
+    else:
+        from spidev import SpiDev
+    device = SpiDev()
+    device.open(0, 0)
+    device.max_speed_hz = 5000000
+    device.mode = 0b11
+    return device
+
+spi = LazyDevice('spi', init_spi)
 
 # ADXL345 Registers
 REG_POWER_CTL = 0x2D
@@ -39,6 +361,7 @@ anomaly_timestamp = 0
 def adxl345_init():
     spi.xfer2([REG_POWER_CTL, 0x08])
 
+@traced('spi')
 def read_axis_z():
     resp = spi.xfer2([0x80 | 0x40 | (REG_DATAX0 + 4), 0x00, 0x00])
     value = resp[1] | (resp[2] << 8)
@@ -50,82 +373,125 @@ def read_axis_z():
 def vibration_analysis():
     global anomaly_detected, peak_magnitude, anomaly_timestamp
     
+    if REALTIME:
+        apply_realtime('sampler')
     adxl345_init()
+    ensure_history_writer()
     z_data = []
+    next_tick = time.perf_counter()
     
     while True:
         z_data.append(read_axis_z())
         if len(z_data) >= SAMPLES:
-            z_array = np.array(z_data[-SAMPLES:])
-            fft_vals = np.fft.fft(z_array)
-            freqs = np.fft.fftfreq(SAMPLES, d=INTERVAL)
-            magnitude = np.abs(fft_vals)[:SAMPLES // 2]
-            freqs = freqs[:SAMPLES // 2]
+            with trace_span('fft'):
+                z_array = np.array(z_data[-SAMPLES:])
+                fft_vals = np.fft.fft(z_array)
+                freqs = np.fft.fftfreq(SAMPLES, d=INTERVAL)
+                magnitude = np.abs(fft_vals)[:SAMPLES // 2]
+                freqs = freqs[:SAMPLES // 2]
             
             # Filter valid frequencies
             valid_indices = np.where(freqs > MIN_FREQ)
             filtered_magnitude = magnitude[valid_indices]
+            filtered_freqs = freqs[valid_indices]
             
             # Anomaly detection
             if len(filtered_magnitude) > 0:
-                current_peak_mag = np.max(filtered_magnitude)
+                peak_index = np.argmax(filtered_magnitude)
+                current_peak_mag = filtered_magnitude[peak_index]
+                peak_freq = float(filtered_freqs[peak_index])
                 peak_magnitude = int(current_peak_mag)
+                now = time.time()
                 
                 if current_peak_mag > THRESHOLD:
                     print(f"[ALERT] Anomaly Detected! Peak Magnitude: {peak_magnitude}")
+                    if not anomaly_detected:
+                        history_event(now, 'anomaly', peak_magnitude, peak_freq)
                     anomaly_detected = True
-                    anomaly_timestamp = time.time()
+                    anomaly_timestamp = now
                 else:
                     # Clear anomaly after 5 seconds
-                    if anomaly_detected and time.time() - anomaly_timestamp > 5:
+                    if anomaly_detected and now - anomaly_timestamp > 5:
                         anomaly_detected = False
+                        history_event(now, 'clear', peak_magnitude, peak_freq)
+
+                history_sample(now, peak_magnitude, peak_freq, float(np.std(z_array)), current_peak_mag > THRESHOLD)
+
+                # Spectrum frames are only built while someone is watching
+                if spectrum_subscribers and now - spectrum_published_at >= 1.0 / SPECTRUM_MAX_HZ:
+                    publish_spectrum(magnitude, freqs, now)
             
             # Remove oldest data to keep buffer size consistent
             z_data = z_data[-SAMPLES:]
             
-        time.sleep(INTERVAL)
+        # Absolute schedule so the FFT work does not stretch the sampling period
+        next_tick += INTERVAL
+        delay = next_tick - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        lateness = time.perf_counter() - next_tick
+        loop_stats['sampler'].tick(lateness)
+        if lateness > INTERVAL:
+            # A whole period behind: resync rather than burst to catch up
+            next_tick = time.perf_counter()
 
 # --------------------- L298N Motor Driver Setup ---------------------
 # Motor GPIO pin definitions
 in1, in2, in3, in4 = 17, 27, 22, 23
 ena, enb = 18, 13
 
-GPIO.setmode(GPIO.BCM)
-GPIO.setwarnings(False)
-for pin in [in1, in2, in3, in4, ena, enb]:
-    GPIO.setup(pin, GPIO.OUT)
+def init_gpio():
+    if SIMULATE_HARDWARE:
+        from simulated_hardware import GPIO as gpio
+    else:
+        import RPi.GPIO as gpio
+    gpio.setmode(gpio.BCM)
+    gpio.setwarnings(False)
+    for pin in [in1, in2, in3, in4, ena, enb]:
+        gpio.setup(pin, gpio.OUT)
+    return gpio
+
+GPIO = LazyDevice('gpio', init_gpio)
 
 # PWM setup
-pwm_ena = GPIO.PWM(ena, 1000)
-pwm_enb = GPIO.PWM(enb, 1000)
-pwm_ena.start(60)
-pwm_enb.start(60)
+def init_pwm(pin):
+    pwm = GPIO.PWM(pin, 1000)
+    pwm.start(60)
+    return pwm
+
+pwm_ena = LazyDevice('pwm_ena', functools.partial(init_pwm, ena))
+pwm_enb = LazyDevice('pwm_enb', functools.partial(init_pwm, enb))
 
 # Car movement functions
+@traced('gpio')
 def car_forward():
     GPIO.output(in1, GPIO.HIGH)
     GPIO.output(in2, GPIO.LOW)
     GPIO.output(in3, GPIO.HIGH)
     GPIO.output(in4, GPIO.LOW)
 
+@traced('gpio')
 def car_backward():
     GPIO.output(in1, GPIO.LOW)
     GPIO.output(in2, GPIO.HIGH)
     GPIO.output(in3, GPIO.LOW)
     GPIO.output(in4, GPIO.HIGH)
 
+@traced('gpio')
 def car_left():
     GPIO.output(in1, GPIO.LOW)
     GPIO.output(in2, GPIO.HIGH)
     GPIO.output(in3, GPIO.HIGH)
     GPIO.output(in4, GPIO.LOW)
 
+@traced('gpio')
 def car_right():
     GPIO.output(in1, GPIO.HIGH)
     GPIO.output(in2, GPIO.LOW)
     GPIO.output(in3, GPIO.LOW)
     GPIO.output(in4, GPIO.HIGH)
 
+@traced('gpio')
 def car_stop():
     GPIO.output(in1, GPIO.LOW)
     GPIO.output(in2, GPIO.LOW)
@@ -134,80 +500,925 @@ def car_stop():
 
 # --------------------- PCA9685 Servo Setup ---------------------
 # Initialize I2C and PCA9685
-i2c = busio.I2C(SCL, SDA)
-pca = PCA9685(i2c)
-pca.frequency = 50
+def init_pca():
+    if SIMULATE_HARDWARE:
+        from simulated_hardware import SimulatedPCA9685
+        device = SimulatedPCA9685()
+    else:
+        import busio
+        from board import SCL, SDA
+        from adafruit_pca9685 import PCA9685
+        device = PCA9685(busio.I2C(SCL, SDA))
+    device.frequency = 50
+    return device
+
+pca = LazyDevice('pca9685', init_pca)
 
 # Servo channel assignments
-base = servo.Servo(pca.channels[0])
-gripper = servo.Servo(pca.channels[1])
-elbow = servo.Servo(pca.channels[2])
+def init_servo(channel):
+    if SIMULATE_HARDWARE:
+        from simulated_hardware import SimulatedServo as Servo
+    else:
+        from adafruit_motor.servo import Servo
+    return Servo(pca.channels[channel])
+
+base = LazyDevice('servo_base', functools.partial(init_servo, 0))
+gripper = LazyDevice('servo_gripper', functools.partial(init_servo, 1))
+elbow = LazyDevice('servo_elbow', functools.partial(init_servo, 2))
 
 # Initial angles
 base_angle = 90
 gripper_angle = 0
 elbow_angle = 90
 
+SERVO_TICK = 0.01  # Seconds between servo updates
+ARM_COMMANDS = ('i', 'k', 'j', 'l', 'o', 'c')
+
 # Smooth angle movement function
-def smooth_set_angle(servo_motor, current_angle, target_angle, speed=0.01):
+@traced('i2c')
+def smooth_set_angle(servo_motor, current_angle, target_angle, speed=SERVO_TICK):
+    # Under the real-time profile moves run on the prioritized motion thread
+    if motion_executor is not None and not getattr(motion_local, 'active', False):
+        return motion_executor.submit(smooth_set_angle, servo_motor, current_angle, target_angle, speed).result()
     step = 1 if target_angle > current_angle else -1
-    for angle in range(current_angle, target_angle + step, step):
+    start = time.perf_counter()
+    for i, angle in enumerate(range(current_angle, target_angle + step, step), 1):
         servo_motor.angle = angle
-        time.sleep(speed)
+        deadline = start + i * speed
+        delay = deadline - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        loop_stats['motion'].tick(time.perf_counter() - deadline)
     return target_angle
 
+# --------------------- Arm Kinematics ---------------------
+# Arm geometry (m). x points forward, y to the right and z up from the ground.
+# The upper arm is fixed at ARM_SHOULDER_PITCH above horizontal and the elbow
+# servo swings the forearm, which is colinear with the upper arm at ELBOW_STRAIGHT
+ARM_BASE_HEIGHT = 0.09
+ARM_UPPER_LENGTH = 0.10
+ARM_FOREARM_LENGTH = 0.12
+ARM_SHOULDER_PITCH = 45  # deg
+ELBOW_STRAIGHT = 90  # deg
+BASE_LIMITS = (0, 180)
+ELBOW_LIMITS = (0, 180)
+GRIPPER_LIMITS = (0, 90)
+
+# Reachability grid and spatial index
+IK_GRID_STEP = 1  # deg
+IK_COARSE_STEP = 5  # deg, grid used for targets far outside the workspace
+IK_CELL_SIZE = 0.02  # Voxel edge (m)
+IK_TOLERANCE = 0.01  # Max distance (m) between target and reached position
+
+# Vectorized: accepts scalars or arrays of servo angles
+def forward_kinematics(base_deg, elbow_deg):
+    yaw = np.radians(np.asarray(base_deg, dtype=float) - 90)
+    forearm = np.radians(ARM_SHOULDER_PITCH + np.asarray(elbow_deg, dtype=float) - ELBOW_STRAIGHT)
+    yaw, forearm = np.broadcast_arrays(yaw, forearm)
+    shoulder = math.radians(ARM_SHOULDER_PITCH)
+    reach = ARM_UPPER_LENGTH * math.cos(shoulder) + ARM_FOREARM_LENGTH * np.cos(forearm)
+    height = ARM_BASE_HEIGHT + ARM_UPPER_LENGTH * math.sin(shoulder) + ARM_FOREARM_LENGTH * np.sin(forearm)
+    return np.stack([reach * np.cos(yaw), reach * np.sin(yaw), height], axis=-1)
+
+class PoseIndex:
+    def __init__(self):
+        bases, elbows = np.meshgrid(
+            np.arange(BASE_LIMITS[0], BASE_LIMITS[1] + 1, IK_GRID_STEP),
+            np.arange(ELBOW_LIMITS[0], ELBOW_LIMITS[1] + 1, IK_GRID_STEP),
+            indexing='ij'
+        )
+        self.angles = np.stack([bases.ravel(), elbows.ravel()], axis=1)
+        self.points = forward_kinematics(self.angles[:, 0], self.angles[:, 1])
+        self.coarse = np.flatnonzero(np.all(self.angles % IK_COARSE_STEP == 0, axis=1))
+
+        # Bucket pose indices by voxel
+        voxels = np.floor(self.points / IK_CELL_SIZE).astype(np.int64)
+        keys, inverse = np.unique(voxels, axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        order = np.argsort(inverse, kind='stable').astype(np.int32)
+        splits = np.cumsum(np.bincount(inverse))[:-1]
+        buckets = dict(zip(map(tuple, keys.tolist()), np.split(order, splits)))
+
+        # Each voxel stores the poses of its 3x3x3 neighbourhood, so a query is a
+        # single lookup that sees every pose within one voxel edge of the target
+        neighbourhoods = collections.defaultdict(list)
+        for (x, y, z), members in buckets.items():
+            for dx, dy, dz in itertools.product((-1, 0, 1), repeat=3):
+                neighbourhoods[(x + dx, y + dy, z + dz)].append(members)
+        self.neighbourhoods = {key: np.concatenate(parts) for key, parts in neighbourhoods.items()}
+
+    def nearest(self, x, y, z):
+        target = np.array((x, y, z))
+        key = (math.floor(x / IK_CELL_SIZE), math.floor(y / IK_CELL_SIZE), math.floor(z / IK_CELL_SIZE))
+        candidates = self.neighbourhoods.get(key)
+        if candidates is not None:
+            delta = self.points[candidates] - target
+            dist = np.einsum('ij,ij->i', delta, delta)
+            i = int(np.argmin(dist))
+            # Poses outside the neighbourhood are at least one voxel edge away
+            if dist[i] <= IK_CELL_SIZE ** 2:
+                return int(candidates[i])
+        # Far outside the workspace: an approximate answer from the coarse grid
+        delta = self.points[self.coarse] - target
+        return int(self.coarse[np.argmin(np.einsum('ij,ij->i', delta, delta))])
+
+pose_index = None
+pose_index_lock = threading.Lock()
+
+def get_pose_index():
+    global pose_index
+    if pose_index is None:
+        with pose_index_lock:
+            if pose_index is None:
+                pose_index = PoseIndex()
+    return pose_index
+
+def _closest_turn(angle, reference):
+    # Shift angle by whole turns to land nearest the reference
+    return angle + 360 * round((reference - angle) / 360)
+
+# Scalar forward kinematics for the refinement step, avoiding NumPy call overhead
+def _gripper_position(base_deg, elbow_deg):
+    yaw = math.radians(base_deg - 90)
+    shoulder = math.radians(ARM_SHOULDER_PITCH)
+    forearm = math.radians(ARM_SHOULDER_PITCH + elbow_deg - ELBOW_STRAIGHT)
+    reach = ARM_UPPER_LENGTH * math.cos(shoulder) + ARM_FOREARM_LENGTH * math.cos(forearm)
+    height = ARM_BASE_HEIGHT + ARM_UPPER_LENGTH * math.sin(shoulder) + ARM_FOREARM_LENGTH * math.sin(forearm)
+    return reach * math.cos(yaw), reach * math.sin(yaw), height
+
+# Refine a grid seed in closed form: the base yaw faces the target, then the
+# forearm points from the elbow pivot at the target within that vertical plane
+def refine_ik(x, y, z, seed_base, seed_elbow):
+    base_deg = _closest_turn(math.degrees(math.atan2(y, x)) + 90, seed_base)
+    if abs(base_deg - seed_base) > 90:
+        # Seed reaches over the top of the base, so face away from the target
+        base_deg = _closest_turn(base_deg + 180, seed_base)
+    base_deg = min(max(base_deg, BASE_LIMITS[0]), BASE_LIMITS[1])
+
+    yaw = math.radians(base_deg - 90)
+    reach = x * math.cos(yaw) + y * math.sin(yaw)
+    shoulder = math.radians(ARM_SHOULDER_PITCH)
+    pivot_reach = ARM_UPPER_LENGTH * math.cos(shoulder)
+    pivot_height = ARM_BASE_HEIGHT + ARM_UPPER_LENGTH * math.sin(shoulder)
+    forearm = math.degrees(math.atan2(z - pivot_height, reach - pivot_reach))
+    elbow_deg = _closest_turn(forearm - ARM_SHOULDER_PITCH + ELBOW_STRAIGHT, seed_elbow)
+    elbow_deg = min(max(elbow_deg, ELBOW_LIMITS[0]), ELBOW_LIMITS[1])
+    return base_deg, elbow_deg
+
+def solve_ik(target):
+    start = time.perf_counter()
+    x, y, z = (float(c) for c in target)
+    index = get_pose_index()
+    seed_base, seed_elbow = index.angles[index.nearest(x, y, z)].tolist()
+
+    # Servos take whole degrees; keep the refinement only if it beats the seed
+    refined_base, refined_elbow = refine_ik(x, y, z, seed_base, seed_elbow)
+    best = None
+    for base_deg, elbow_deg in ((seed_base, seed_elbow), (round(refined_base), round(refined_elbow))):
+        reached = _gripper_position(base_deg, elbow_deg)
+        error = math.dist(reached, (x, y, z))
+        if best is None or error < best['error']:
+            best = {'base': base_deg, 'elbow': elbow_deg, 'reached': reached, 'error': error}
+    best['reached'] = [round(c, 4) for c in best['reached']]
+    best['error'] = round(best['error'], 4)
+    best['solve_ms'] = round((time.perf_counter() - start) * 1000, 3)
+    return best
+
+# --------------------- Arm Macros ---------------------
+# Sessions are recorded as [t, base, elbow, gripper] waypoints, saved as JSON and
+# compiled once into minimum-jerk servo samples spaced SERVO_TICK apart
+MACRO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'macros')
+MACRO_NAME = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+MACRO_DWELL = 0.5  # Pauses longer than this (s) are kept as waypoints
+MACRO_MAX_SPEED = 100  # Peak joint speed (deg/s), same as smooth_set_angle
+MACRO_MAX_DURATION = 600  # Longest macro accepted (s)
+
+macro_recording = None
+compiled_macros = {}
+playback_thread = None
+playback_abort = threading.Event()
+playback_unpaused = threading.Event()
+
+def record_waypoint():
+    if macro_recording is not None:
+        elapsed = round(time.perf_counter() - macro_recording['start'], 3)
+        macro_recording['waypoints'].append([elapsed, base_angle, elbow_angle, gripper_angle])
+
+# Held keys record one waypoint per 5 degree step; keep only the waypoints where
+# a joint starts, stops or reverses, or where the operator dwelled
+def simplify_waypoints(points):
+    if len(points) < 2:
+        return points
+    steps = np.diff(points[:, 1:], axis=0)
+    direction = np.sign(steps)
+    turning = np.any(direction[1:] != direction[:-1], axis=1)
+    # A dwell is a long gap after a waypoint, before the next step starts
+    dwelling = np.diff(points[:, 0]) > MACRO_DWELL
+    keep = np.concatenate([[True], turning | dwelling[1:], [True]])
+
+    # Hold the dwell pose until the next step starts, so playback stops there
+    # instead of creeping towards the following waypoint
+    step_time = np.max(np.abs(steps), axis=1) / MACRO_MAX_SPEED
+    hold_at = np.maximum(points[1:, 0] - step_time, points[:-1, 0])
+    holding = dwelling & (step_time > 0) & (hold_at > points[:-1, 0])
+    holds = np.column_stack([hold_at, points[:-1, 1:]])[holding]
+    points = np.vstack([points[keep], holds])
+    return points[np.argsort(points[:, 0], kind='stable')]
+
+# Macro files can be edited by hand, so reject anything playback could not
+# follow before a single servo moves
+def validate_waypoints(waypoints):
+    points = np.asarray(waypoints, dtype=float)
+    if points.ndim != 2 or points.shape[1] != 4:
+        raise ValueError('waypoints must be [t, base, elbow, gripper] rows')
+    if not np.all(np.isfinite(points)):
+        raise ValueError('waypoints must be finite numbers')
+    if len(points) < 2:
+        raise ValueError('macro needs at least two waypoints')
+    times = points[:, 0]
+    if times[0] < 0 or np.any(np.diff(times) < 0):
+        raise ValueError('waypoint times must start at 0 or later and never go backwards')
+    joints = zip(('base', 'elbow', 'gripper'), points[:, 1:].T, (BASE_LIMITS, ELBOW_LIMITS, GRIPPER_LIMITS))
+    for joint, angles, (low, high) in joints:
+        if np.any((angles < low) | (angles > high)):
+            raise ValueError(f"{joint} angles must be within {low}-{high} degrees")
+    return points
+
+def compile_trajectory(waypoints):
+    points = simplify_waypoints(validate_waypoints(waypoints))
+    angles = points[:, 1:]
+
+    # Minimum-jerk peaks at 1.875x the mean speed; stretch segments that would
+    # drive a joint faster than MACRO_MAX_SPEED
+    travel = np.max(np.abs(np.diff(angles, axis=0)), axis=1)
+    durations = np.maximum(np.diff(points[:, 0]), 1.875 * travel / MACRO_MAX_SPEED)
+    durations = np.maximum(durations, SERVO_TICK)
+    knots = np.concatenate([[0.0], np.cumsum(durations)])
+    if knots[-1] > MACRO_MAX_DURATION:
+        raise ValueError(f"macro would run for {knots[-1]:.0f}s, the limit is {MACRO_MAX_DURATION}s")
+
+    t = np.append(np.arange(0.0, knots[-1], SERVO_TICK), knots[-1])
+    segment = np.clip(np.searchsorted(knots, t, side='right') - 1, 0, len(durations) - 1)
+    tau = np.clip((t - knots[segment]) / durations[segment], 0.0, 1.0)
+    blend = tau ** 3 * (10 - 15 * tau + 6 * tau ** 2)
+    start = angles[segment]
+    samples = np.rint(start + (angles[segment + 1] - start) * blend[:, None]).astype(np.int16)
+
+    # Only servos whose whole-degree angle changed get written on each tick
+    changed = np.vstack([np.ones((1, 3), dtype=bool), np.diff(samples, axis=0) != 0])
+    return samples, changed
+
+def macro_path(name):
+    return os.path.join(MACRO_DIR, f"{name}.json")
+
+# Compile first so a recording that can't be played never reaches disk
+def save_macro(name, waypoints):
+    compiled = compile_trajectory(waypoints)
+    os.makedirs(MACRO_DIR, exist_ok=True)
+    with open(macro_path(name), 'w') as f:
+        json.dump({'name': name, 'waypoints': waypoints}, f)
+    compiled_macros[name] = compiled
+    return compiled
+
+def load_macro(name):
+    if name not in compiled_macros:
+        with open(macro_path(name)) as f:
+            compiled_macros[name] = compile_trajectory(json.load(f)['waypoints'])
+    return compiled_macros[name]
+
+def playback_active():
+    return playback_thread is not None and playback_thread.is_alive()
+
+def play_trajectory(samples, changed):
+    global base_angle, elbow_angle, gripper_angle
+    if REALTIME:
+        motion_local.active = True
+        apply_realtime('playback')
+    with trace_span('macro.play', {'samples': len(samples)}):
+        # Reach the first sample with the regular smoothing
+        first = samples[0].tolist()
+        base_angle = smooth_set_angle(base, base_angle, first[0])
+        elbow_angle = smooth_set_angle(elbow, elbow_angle, first[1])
+        gripper_angle = smooth_set_angle(gripper, gripper_angle, first[2])
+
+        servos = (base, elbow, gripper)
+        rows = samples.tolist()
+        masks = changed.tolist()
+        start = time.perf_counter()
+        for i, (row, mask) in enumerate(zip(rows, masks)):
+            if not playback_unpaused.is_set():
+                paused_at = time.perf_counter()
+                playback_unpaused.wait()
+                start += time.perf_counter() - paused_at
+            if playback_abort.is_set():
+                break
+            deadline = start + i * SERVO_TICK
+            delay = deadline - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            loop_stats['playback'].tick(time.perf_counter() - deadline)
+            for servo_motor, angle, write in zip(servos, row, mask):
+                if write:
+                    servo_motor.angle = angle
+            base_angle, elbow_angle, gripper_angle = row
+
+# --------------------- Telemetry Fan-out ---------------------
+# One producer thread serializes the rover state only when it changes; every
+# poller and stream subscriber is handed the same pre-encoded bytes
+TELEMETRY_PERIOD = 0.05  # Producer change-check period (s)
+TELEMETRY_MAX_HZ = 20  # Per-client stream rate cap
+TELEMETRY_KEEPALIVE = 15  # Seconds between keepalives on an idle stream
+
+telemetry_condition = threading.Condition()
+telemetry_thread = None
+telemetry_seq = 0
+telemetry_state = None
+telemetry_json = b'{}'
+telemetry_event = b''
+
+def publish_telemetry():
+    global telemetry_seq, telemetry_state, telemetry_json, telemetry_event
+    playing = playback_active()
+    state = (anomaly_detected, peak_magnitude, base_angle, elbow_angle, gripper_angle, playing)
+    if state == telemetry_state:
+        return
+    payload = json.dumps({
+        'anomaly_detected': anomaly_detected,
+        'peak_magnitude': peak_magnitude,
+        'positions': {
+            'base': base_angle,
+            'elbow': elbow_angle,
+            'gripper': gripper_angle
+        },
+        'playing': playing
+    }, separators=(',', ':')).encode()
+    with telemetry_condition:
+        telemetry_seq += 1
+        telemetry_state = state
+        telemetry_json = payload
+        telemetry_event = b'id: %d\ndata: %s\n\n' % (telemetry_seq, payload)
+        telemetry_condition.notify_all()
+
+def telemetry_producer():
+    while True:
+        publish_telemetry()
+        time.sleep(TELEMETRY_PERIOD)
+
+# Started by the first telemetry consumer, so importing the module stays inert
+def ensure_telemetry_producer():
+    global telemetry_thread
+    if telemetry_thread is None:
+        with telemetry_condition:
+            if telemetry_thread is None:
+                publish_telemetry()
+                telemetry_thread = threading.Thread(target=telemetry_producer, name='telemetry', daemon=True)
+                telemetry_thread.start()
+
+# Server-sent events; a slow client skips straight to the newest snapshot
+def telemetry_stream(max_hz):
+    interval = 1.0 / max_hz
+    last_seq = None
+    while True:
+        with telemetry_condition:
+            if telemetry_seq == last_seq:
+                telemetry_condition.wait(TELEMETRY_KEEPALIVE)
+            seq, event = telemetry_seq, telemetry_event
+        if seq == last_seq:
+            yield b': keepalive\n\n'
+        else:
+            last_seq = seq
+            yield event
+            time.sleep(interval)
+
+# --------------------- Anomaly History Store ---------------------
+# The sampler only appends to in-memory queues; a writer thread flushes them to
+# SQLite (WAL mode) in batches, folding samples into 1 s, 1 min and 1 h rollups
+# keyed by (resolution, bucket start) so range queries are index scans. Simulated
+# runs default to a per-process database so their noise never mixes with the
+# real history or with other simulated rovers
+if SIMULATE_HARDWARE:
+    HISTORY_DB_DEFAULT = os.path.join(tempfile.gettempdir(), f"rover_history_sim_{os.getpid()}.db")
+else:
+    HISTORY_DB_DEFAULT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rover_history.db')
+HISTORY_DB = os.environ.get('ROVER_HISTORY_DB', HISTORY_DB_DEFAULT)
+HISTORY_FLUSH = 1.0  # Seconds between batch writes
+HISTORY_QUEUE_MAX = 10000  # Samples buffered if the writer falls behind
+HISTORY_RESOLUTIONS = (1, 60, 3600)  # Rollup bucket widths (s)
+HISTORY_RETENTION = {1: 2 * 86400, 60: 90 * 86400, 3600: None}  # Seconds kept per resolution
+HISTORY_PRUNE_EVERY = 3600  # Seconds between retention sweeps
+HISTORY_MAX_POINTS = 1500  # Auto resolution keeps charts under this many points
+HISTORY_MAX_EVENTS = 500
+
+HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollups (
+    resolution INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    samples INTEGER NOT NULL,
+    peak_max REAL NOT NULL,
+    peak_sum REAL NOT NULL,
+    peak_freq REAL NOT NULL,
+    rms_sum REAL NOT NULL,
+    anomalies INTEGER NOT NULL,
+    PRIMARY KEY (resolution, bucket)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS events (
+    ts REAL NOT NULL,
+    kind TEXT NOT NULL,
+    peak REAL NOT NULL,
+    freq REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+"""
+
+# Merging keeps the frequency that belongs to the larger peak; SQLite evaluates
+# every SET expression against the old row
+HISTORY_UPSERT = """
+INSERT INTO rollups (resolution, bucket, samples, peak_max, peak_sum, peak_freq, rms_sum, anomalies)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (resolution, bucket) DO UPDATE SET
+    samples = samples + excluded.samples,
+    peak_max = MAX(peak_max, excluded.peak_max),
+    peak_sum = peak_sum + excluded.peak_sum,
+    peak_freq = CASE WHEN excluded.peak_max > peak_max THEN excluded.peak_freq ELSE peak_freq END,
+    rms_sum = rms_sum + excluded.rms_sum,
+    anomalies = anomalies + excluded.anomalies
+"""
+
+history_samples = collections.deque(maxlen=HISTORY_QUEUE_MAX)
+history_events = collections.deque(maxlen=HISTORY_QUEUE_MAX)
+history_thread = None
+history_lock = threading.Lock()
+history_read_lock = threading.Lock()
+history_read_conn = None
+
+# Called from the sampler thread; deque appends are atomic and never block
+def history_sample(ts, peak, freq, rms, anomalous):
+    history_samples.append((ts, peak, freq, rms, anomalous))
+
+def history_event(ts, kind, peak, freq):
+    history_events.append((ts, kind, peak, freq))
+
+def history_connect():
+    # The shared reader connection is used from whichever request thread holds history_read_lock
+    conn = sqlite3.connect(HISTORY_DB, timeout=5, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+def drain(buffer):
+    items = []
+    while buffer:
+        items.append(buffer.popleft())
+    return items
+
+# Fold samples into per-resolution rows: [samples, peak_max, peak_sum, peak_freq, rms_sum, anomalies]
+def rollup_samples(samples):
+    buckets = {}
+    for ts, peak, freq, rms, anomalous in samples:
+        for resolution in HISTORY_RESOLUTIONS:
+            key = (resolution, int(ts // resolution) * resolution)
+            row = buckets.get(key)
+            if row is None:
+                buckets[key] = [1, peak, peak, freq, rms, int(anomalous)]
+                continue
+            row[0] += 1
+            if peak > row[1]:
+                row[1] = peak
+                row[3] = freq
+            row[2] += peak
+            row[4] += rms
+            row[5] += int(anomalous)
+    return [(resolution, bucket, *row) for (resolution, bucket), row in buckets.items()]
+
+def prune_history(conn, now):
+    for resolution, keep in HISTORY_RETENTION.items():
+        if keep is not None:
+            conn.execute('DELETE FROM rollups WHERE resolution = ? AND bucket < ?', (resolution, now - keep))
+
+def history_writer():
+    conn = history_connect()
+    conn.executescript(HISTORY_SCHEMA)
+    last_prune = 0
+    while True:
+        time.sleep(HISTORY_FLUSH)
+        samples = drain(history_samples)
+        events = drain(history_events)
+        if not samples and not events:
+            continue
+        try:
+            with trace_span('history.flush', {'samples': len(samples), 'events': len(events)}):
+                with conn:
+                    conn.executemany(HISTORY_UPSERT, rollup_samples(samples))
+                    conn.executemany('INSERT INTO events (ts, kind, peak, freq) VALUES (?, ?, ?, ?)', events)
+                    now = time.time()
+                    if now - last_prune > HISTORY_PRUNE_EVERY:
+                        prune_history(conn, now)
+                        last_prune = now
+        except sqlite3.Error as e:
+            print(f"[HISTORY] Dropped {len(samples)} samples and {len(events)} events: {e}")
+
+def ensure_history_writer():
+    global history_thread
+    with history_lock:
+        if history_thread is None:
+            history_thread = threading.Thread(target=history_writer, name='history', daemon=True)
+            history_thread.start()
+
+# Werkzeug serves every request on a new thread, so queries share one reader
+# connection behind history_read_lock; WAL lets it read while the writer commits
+def history_reader():
+    global history_read_conn
+    if history_read_conn is None:
+        conn = history_connect()
+        conn.executescript(HISTORY_SCHEMA)
+        history_read_conn = conn
+    return history_read_conn
+
+def pick_resolution(span):
+    for resolution in HISTORY_RESOLUTIONS:
+        if span / resolution <= HISTORY_MAX_POINTS:
+            return resolution
+    return HISTORY_RESOLUTIONS[-1]
+
+def query_history(start, end, resolution=None):
+    resolution = resolution or pick_resolution(end - start)
+    with history_read_lock:
+        conn = history_reader()
+        rows = conn.execute(
+            'SELECT bucket, samples, peak_max, peak_sum, peak_freq, rms_sum, anomalies FROM rollups '
+            'WHERE resolution = ? AND bucket >= ? AND bucket < ? ORDER BY bucket',
+            (resolution, int(start // resolution) * resolution, end)
+        ).fetchall()
+        events = conn.execute(
+            'SELECT ts, kind, peak, freq FROM events WHERE ts >= ? AND ts < ? ORDER BY ts DESC LIMIT ?',
+            (start, end, HISTORY_MAX_EVENTS)
+        ).fetchall()
+
+    # Column-oriented so charting code can plot each series directly
+    series = {'t': [], 'peak_max': [], 'peak_mean': [], 'peak_freq': [], 'rms': [], 'anomalies': []}
+    for bucket, samples, peak_max, peak_sum, peak_freq, rms_sum, anomalies in rows:
+        series['t'].append(bucket)
+        series['peak_max'].append(round(peak_max, 1))
+        series['peak_mean'].append(round(peak_sum / samples, 1))
+        series['peak_freq'].append(round(peak_freq, 2))
+        series['rms'].append(round(rms_sum / samples, 2))
+        series['anomalies'].append(anomalies)
+    return {
+        'start': start,
+        'end': end,
+        'resolution': resolution,
+        'series': series,
+        'events': [
+            {'ts': ts, 'kind': kind, 'peak': peak, 'freq': freq}
+            for ts, kind, peak, freq in reversed(events)
+        ]
+    }
+
+# --------------------- Spectrum Streaming ---------------------
+# The sampler hands over at most SPECTRUM_MAX_HZ spectra per second. Each client
+# picks its own rate, bin count and encoding, and every distinct encoding of a
+# frame is built once and shared. Frames are little-endian binary:
+#   uint32 frame length, uint32 seq, float32 scale, uint16 bins, uint8 format,
+#   uint8 reserved, then `bins` float32 magnitudes (format 0) or uint8 levels
+#   (format 1, magnitude = level / 255 * scale). Zero-bin frames are keepalives.
+SPECTRUM_MAX_HZ = 10
+SPECTRUM_BIN_CHOICES = (8, 16, 32, 64)  # Divisors of SAMPLES // 2
+SPECTRUM_FULL_SCALE = 2 * THRESHOLD  # uint8 level 255
+SPECTRUM_KEEPALIVE = 5  # Seconds between keepalive frames on an idle stream
+SPECTRUM_FORMATS = {'f32': 0, 'u8': 1}
+SPECTRUM_HEADER = struct.Struct('<IIfHBB')
+
+spectrum_condition = threading.Condition()
+spectrum_subscribers = 0
+spectrum_published_at = 0
+spectrum_seq = 0
+spectrum_frame = None
+spectrum_cache = (None, {})
+
+def publish_spectrum(magnitude, freqs, now):
+    global spectrum_published_at, spectrum_seq, spectrum_frame
+    frame = magnitude.astype('<f4')
+    # Same DC/low-frequency cut as the anomaly detector
+    frame[freqs <= MIN_FREQ] = 0
+    with spectrum_condition:
+        spectrum_published_at = now
+        spectrum_seq += 1
+        spectrum_frame = frame
+        spectrum_condition.notify_all()
+
+def encode_spectrum(seq, frame, bins, fmt):
+    global spectrum_cache
+    cache = spectrum_cache
+    if cache[0] != seq:
+        cache = spectrum_cache = (seq, {})
+    encoded = cache[1].get((bins, fmt))
+    if encoded is None:
+        # Decimate by keeping the strongest bin of each group
+        reduced = frame.reshape(bins, -1).max(axis=1)
+        if fmt == SPECTRUM_FORMATS['u8']:
+            scale = SPECTRUM_FULL_SCALE
+            payload = np.clip(reduced * (255.0 / scale), 0, 255).astype(np.uint8).tobytes()
+        else:
+            scale = 1.0
+            payload = reduced.tobytes()
+        header = SPECTRUM_HEADER.pack(SPECTRUM_HEADER.size + len(payload), seq, scale, bins, fmt, 0)
+        encoded = cache[1][(bins, fmt)] = header + payload
+    return encoded
+
+def spectrum_stream(hz, bins, fmt):
+    global spectrum_subscribers, spectrum_frame
+    interval = 1.0 / hz
+    keepalive = SPECTRUM_HEADER.pack(SPECTRUM_HEADER.size, 0, 0.0, 0, fmt, 0)
+    last_seq = None
+    with spectrum_condition:
+        spectrum_subscribers += 1
+    try:
+        while True:
+            with spectrum_condition:
+                if spectrum_seq == last_seq or spectrum_frame is None:
+                    spectrum_condition.wait(SPECTRUM_KEEPALIVE)
+                seq, frame = spectrum_seq, spectrum_frame
+            if seq == last_seq or frame is None:
+                yield keepalive
+                continue
+            last_seq = seq
+            yield encode_spectrum(seq, frame, bins, fmt)
+            time.sleep(interval)
+    finally:
+        with spectrum_condition:
+            spectrum_subscribers -= 1
+            # Nothing is published without subscribers, so don't hand the next
+            # client a stale spectrum as its first row
+            if spectrum_subscribers == 0:
+                spectrum_frame = None
+
+# --------------------- Hardware Startup ---------------------
+# Each stage owns one independent bus (plus the CPU-only IK grid), so the
+# stages run concurrently
+def start_spi():
+    spi.resolve()
+
+def start_gpio():
+    if not REALTIME:
+        pwm_ena.resolve()
+        pwm_enb.resolve()
+        return
+    # RPi.GPIO's software PWM threads inherit the scheduling of the thread that
+    # starts them; the pool worker drops it again before running other stages
+    apply_realtime('pwm')
+    try:
+        pwm_ena.resolve()
+        pwm_enb.resolve()
+    finally:
+        restore_default_scheduling()
+
+# Puts the arm in the pose that telemetry, IK and macros plan from, as the
+# original startup code did
+def start_i2c():
+    base.angle = base_angle
+    elbow.angle = elbow_angle
+    gripper.angle = gripper_angle
+
+STARTUP_STAGES = {
+    'spi': start_spi,
+    'gpio': start_gpio,
+    'i2c': start_i2c,
+    'ik': get_pose_index
+}
+
+hardware_status = {
+    name: {'state': 'pending', 'seconds': None, 'error': None}
+    for name in STARTUP_STAGES
+}
+
+def run_startup_stage(name, stage):
+    status = hardware_status[name]
+    start = time.perf_counter()
+    try:
+        with trace_span(f"startup.{name}"):
+            stage()
+        status['state'] = 'ready'
+    except Exception as e:
+        status['state'] = 'failed'
+        status['error'] = str(e)
+    status['seconds'] = round(time.perf_counter() - start, 4)
+    if status['error']:
+        print(f"[INIT] {name} failed after {status['seconds']:.3f}s: {status['error']}")
+    else:
+        print(f"[INIT] {name} ready in {status['seconds']:.3f}s")
+
+def init_hardware():
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(STARTUP_STAGES), thread_name_prefix='startup') as pool:
+        for name, stage in STARTUP_STAGES.items():
+            pool.submit(run_startup_stage, name, stage)
+    print(f"[INIT] Hardware startup finished in {time.perf_counter() - start:.3f}s")
+    if REALTIME:
+        settle_gc()
+
 # --------------------- Flask Routes ---------------------
+def render_dashboard(viewer):
+    return render_template_string(
+        HTML,
+        viewer=viewer,
+        max_freq=SAMPLING_RATE / 2,
+        spectrum_full_scale=SPECTRUM_FULL_SCALE
+    )
+
 @app.route('/')
 def index():
-    return render_template_string(HTML)
+    return render_dashboard(viewer=False)
+
+# Read-only dashboard: live telemetry without any drive or arm controls
+@app.route('/viewer')
+def viewer():
+    return render_dashboard(viewer=True)
 
 @app.route('/control/<command>', methods=['GET'])
 def control(command):
     global base_angle, gripper_angle, elbow_angle
     
+    with trace_span('parse', {'command': command}):
+        speed = int(command.split('-')[1]) if command.startswith('speed-') else None
+        arm_command = command in ARM_COMMANDS
+
     # Motor speed control
-    if command.startswith('speed-'):
-        speed = int(command.split('-')[1])
-        pwm_ena.ChangeDutyCycle(speed)
-        pwm_enb.ChangeDutyCycle(speed)
-        return jsonify({'status': 'success', 'command': command, 'speed': speed})
-
-    # Car movement
-    if command == 'w':
-        car_forward()
-    elif command == 's':
-        car_backward()
-    elif command == 'a':
-        car_left()
-    elif command == 'd':
-        car_right()
-    elif command == 'stop':
-        car_stop()
-    
-    # Arm movement
-    elif command == 'i':
-        new_angle = min(180, elbow_angle + 5)
-        elbow_angle = smooth_set_angle(elbow, elbow_angle, new_angle)
-    elif command == 'k':
-        new_angle = max(0, elbow_angle - 5)
-        elbow_angle = smooth_set_angle(elbow, elbow_angle, new_angle)
-    elif command == 'j':
-        new_angle = max(0, base_angle - 5)
-        base_angle = smooth_set_angle(base, base_angle, new_angle)
-    elif command == 'l':
-        new_angle = min(180, base_angle + 5)
-        base_angle = smooth_set_angle(base, base_angle, new_angle)
-    elif command == 'o':
-        new_angle = max(0, gripper_angle - 5)
-        gripper_angle = smooth_set_angle(gripper, gripper_angle, new_angle)
-    elif command == 'c':
-        new_angle = min(90, gripper_angle + 5)
-        gripper_angle = smooth_set_angle(gripper, gripper_angle, new_angle)
+    if speed is not None:
+        with trace_span('gpio.ChangeDutyCycle'):
+            pwm_ena.ChangeDutyCycle(speed)
+            pwm_enb.ChangeDutyCycle(speed)
+        with trace_span('response'):
+            return jsonify({'status': 'success', 'command': command, 'speed': speed})
+
+    if arm_command and playback_active():
+        return jsonify({'status': 'error', 'message': 'macro playback in progress'}), 409
+
+    with trace_span('dispatch', {'command': command}):
+        # Car movement
+        if command == 'w':
+            car_forward()
+        elif command == 's':
+            car_backward()
+        elif command == 'a':
+            car_left()
+        elif command == 'd':
+            car_right()
+        elif command == 'stop':
+            car_stop()
+
+        # Arm movement
+        elif command == 'i':
+            new_angle = min(180, elbow_angle + 5)
+            elbow_angle = smooth_set_angle(elbow, elbow_angle, new_angle)
+        elif command == 'k':
+            new_angle = max(0, elbow_angle - 5)
+            elbow_angle = smooth_set_angle(elbow, elbow_angle, new_angle)
+        elif command == 'j':
+            new_angle = max(0, base_angle - 5)
+            base_angle = smooth_set_angle(base, base_angle, new_angle)
+        elif command == 'l':
+            new_angle = min(180, base_angle + 5)
+            base_angle = smooth_set_angle(base, base_angle, new_angle)
+        elif command == 'o':
+            new_angle = max(0, gripper_angle - 5)
+            gripper_angle = smooth_set_angle(gripper, gripper_angle, new_angle)
+        elif command == 'c':
+            new_angle = min(90, gripper_angle + 5)
+            gripper_angle = smooth_set_angle(gripper, gripper_angle, new_angle)
+
+    if arm_command:
+        record_waypoint()
 
     # Return positions for the UI to update
+    with trace_span('response'):
+        return jsonify({
+            'status': 'success', 
+            'command': command,
+            'positions': {
+                'base': base_angle,
+                'elbow': elbow_angle,
+                'gripper': gripper_angle
+            }
+        })
+
+@app.errorhandler(DeviceUnavailable)
+def device_unavailable(error):
+    return jsonify({'status': 'error', 'message': str(error)}), 503
+
+# Move the gripper to a Cartesian position, e.g. /arm/goto?x=0.165&y=0.095&z=0.161 (m).
+# With the shoulder fixed, base and elbow only sweep a 2-D surface, so targets
+# off that surface by more than IK_TOLERANCE are refused as out of reach
+@app.route('/arm/goto', methods=['GET'])
+def arm_goto():
+    global base_angle, elbow_angle
+    try:
+        target = [float(request.args[axis]) for axis in ('x', 'y', 'z')]
+        if not all(math.isfinite(v) for v in target):
+            raise ValueError('non-finite coordinate')
+    except (KeyError, ValueError):
+        return jsonify({'status': 'error', 'message': 'x, y and z query parameters (m) are required and must be finite'}), 400
+
+    if playback_active():
+        return jsonify({'status': 'error', 'message': 'macro playback in progress'}), 409
+
+    with trace_span('ik.solve'):
+        solution = solve_ik(target)
+    if solution['error'] > IK_TOLERANCE:
+        return jsonify({'status': 'error', 'message': 'target out of reach', 'target': target, **solution}), 422
+
+    with trace_span('dispatch', {'command': 'goto'}):
+        base_angle = smooth_set_angle(base, base_angle, solution['base'])
+        elbow_angle = smooth_set_angle(elbow, elbow_angle, solution['elbow'])
+    record_waypoint()
+
+    return jsonify({
+        'status': 'success',
+        'command': 'goto',
+        'target': target,
+        **solution,
+        'positions': {
+            'base': base_angle,
+            'elbow': elbow_angle,
+            'gripper': gripper_angle
+        }
+    })
+
+# --------------------- Macro Routes ---------------------
+@app.route('/arm/macros', methods=['GET'])
+def macro_list():
+    names = []
+    if os.path.isdir(MACRO_DIR):
+        names = sorted(f[:-5] for f in os.listdir(MACRO_DIR) if f.endswith('.json'))
+    return jsonify({
+        'macros': names,
+        'recording': macro_recording['name'] if macro_recording else None,
+        'playing': playback_active(),
+        'paused': playback_active() and not playback_unpaused.is_set()
+    })
+
+@app.route('/arm/macro/record/<name>', methods=['GET'])
+def macro_record(name):
+    global macro_recording
+    if not MACRO_NAME.match(name):
+        return jsonify({'status': 'error', 'message': 'macro names use letters, digits, - and _'}), 400
+    if playback_active():
+        return jsonify({'status': 'error', 'message': 'macro playback in progress'}), 409
+    macro_recording = {'name': name, 'start': time.perf_counter(), 'waypoints': []}
+    record_waypoint()
+    return jsonify({'status': 'success', 'recording': name})
+
+@app.route('/arm/macro/stop', methods=['GET'])
+def macro_stop():
+    global macro_recording
+    if macro_recording is None:
+        return jsonify({'status': 'error', 'message': 'not recording'}), 409
+    recording, macro_recording = macro_recording, None
+    waypoint_count = len(recording['waypoints'])
+    try:
+        samples, _ = save_macro(recording['name'], recording['waypoints'])
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 422
     return jsonify({
-        'status': 'success', 
-        'command': command,
+        'status': 'success',
+        'macro': recording['name'],
+        'waypoints': waypoint_count,
+        'duration': round(len(samples) * SERVO_TICK, 2)
+    })
+
+@app.route('/arm/macro/play/<name>', methods=['GET'])
+def macro_play(name):
+    global playback_thread
+    if not MACRO_NAME.match(name):
+        return jsonify({'status': 'error', 'message': 'macro names use letters, digits, - and _'}), 400
+    if playback_active() or macro_recording is not None:
+        return jsonify({'status': 'error', 'message': 'arm is busy recording or playing'}), 409
+    try:
+        samples, changed = load_macro(name)
+    except FileNotFoundError:
+        return jsonify({'status': 'error', 'message': f"no macro named '{name}'"}), 404
+    except (json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+        return jsonify({'status': 'error', 'message': f"macro '{name}' is invalid: {e}"}), 422
+    playback_abort.clear()
+    playback_unpaused.set()
+    playback_thread = threading.Thread(target=play_trajectory, args=(samples, changed), name='macro', daemon=True)
+    playback_thread.start()
+    return jsonify({'status': 'success', 'macro': name, 'duration': round(len(samples) * SERVO_TICK, 2)})
+
+@app.route('/arm/macro/<action>', methods=['GET'])
+def macro_playback_control(action):
+    if action == 'pause':
+        playback_unpaused.clear()
+    elif action == 'resume':
+        playback_unpaused.set()
+    elif action == 'abort':
+        playback_abort.set()
+        playback_unpaused.set()
+    else:
+        return jsonify({'status': 'error', 'message': f"unknown macro action '{action}'"}), 400
+    return jsonify({
+        'status': 'success',
+        'action': action,
+        'playing': playback_active(),
         'positions': {
             'base': base_angle,
             'elbow': elbow_angle,
@@ -215,15 +1426,126 @@ def control(command):
         }
     })
 
+# Route to report scheduling, missed loop deadlines and GC pauses
+@app.route('/status/realtime', methods=['GET'])
+def realtime_status():
+    return jsonify(realtime_report())
+
+# Route to report per-stage hardware startup state and timing
+@app.route('/status/hardware', methods=['GET'])
+def hardware_status_route():
+    return jsonify(hardware_status)
+
 # Route to check for anomalies
 @app.route('/check_anomaly', methods=['GET'])
 def check_anomaly():
-    global anomaly_detected, peak_magnitude
-    return jsonify({
-        'anomaly_detected': anomaly_detected,
-        'peak_magnitude': peak_magnitude
+    ensure_telemetry_producer()
+    return Response(telemetry_json, mimetype='application/json')
+
+# Anomaly history, e.g. /history?start=1700000000&end=1700086400 (unix seconds).
+# Defaults to the last hour; resolution (1, 60 or 3600 s) is chosen from the span
+@app.route('/history', methods=['GET'])
+def history():
+    end = request.args.get('end', default=time.time(), type=float)
+    start = request.args.get('start', default=end - 3600, type=float)
+    resolution = request.args.get('resolution', type=int)
+    if not (math.isfinite(start) and math.isfinite(end)):
+        return jsonify({'status': 'error', 'message': 'start and end must be finite unix times'}), 400
+    if start >= end:
+        return jsonify({'status': 'error', 'message': 'start must be before end'}), 400
+    if resolution is not None and resolution not in HISTORY_RESOLUTIONS:
+        return jsonify({'status': 'error', 'message': f"resolution must be one of {list(HISTORY_RESOLUTIONS)}"}), 400
+    with trace_span('history.query'):
+        try:
+            return jsonify(query_history(start, end, resolution))
+        except sqlite3.Error as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 503
+
+# Binary spectrum frames, e.g. /spectrum/stream?hz=5&bins=32&format=u8
+@app.route('/spectrum/stream', methods=['GET'])
+def spectrum_stream_route():
+    hz = request.args.get('hz', default=5, type=float)
+    bins = request.args.get('bins', default=SAMPLES // 2, type=int)
+    fmt = request.args.get('format', default='u8')
+    if not math.isfinite(hz):
+        return jsonify({'status': 'error', 'message': 'hz must be a finite number'}), 400
+    if bins not in SPECTRUM_BIN_CHOICES:
+        return jsonify({'status': 'error', 'message': f"bins must be one of {list(SPECTRUM_BIN_CHOICES)}"}), 400
+    if fmt not in SPECTRUM_FORMATS:
+        return jsonify({'status': 'error', 'message': f"format must be one of {list(SPECTRUM_FORMATS)}"}), 400
+    hz = min(max(hz, 0.1), SPECTRUM_MAX_HZ)
+    return Response(spectrum_stream(hz, bins, SPECTRUM_FORMATS[fmt]), mimetype='application/octet-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
     })
 
+# Shared telemetry stream, rate capped per client with ?max_hz=
+@app.route('/telemetry/stream', methods=['GET'])
+def telemetry_stream_route():
+    ensure_telemetry_producer()
+    max_hz = request.args.get('max_hz', default=TELEMETRY_MAX_HZ, type=float)
+    if not math.isfinite(max_hz):
+        return jsonify({'status': 'error', 'message': 'max_hz must be a finite number'}), 400
+    max_hz = min(max(max_hz, 0.1), TELEMETRY_MAX_HZ)
+    return Response(telemetry_stream(max_hz), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+# --------------------- Debug Routes ---------------------
+# Whole-request span; the inner parse/dispatch/response spans nest inside it
+@app.before_request
+def trace_request_start():
+    if trace_enabled:
+        g.trace_start = time.perf_counter()
+
+@app.after_request
+def trace_request_end(response):
+    start = g.pop('trace_start', None)
+    if start is not None:
+        record_span('request', start, time.perf_counter(), {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code
+        })
+    return response
+
+@app.route('/debug/trace/<state>', methods=['GET'])
+def debug_trace_state(state):
+    global trace_enabled
+    if state == 'on':
+        trace_enabled = True
+    elif state == 'off':
+        trace_enabled = False
+    elif state == 'clear':
+        trace_events.clear()
+    else:
+        return jsonify({'status': 'error', 'message': f"unknown trace state '{state}'"}), 400
+    return jsonify({'status': 'success', 'tracing': trace_enabled, 'events': len(trace_events)})
+
+@app.route('/debug/trace', methods=['GET'])
+def debug_trace_export():
+    response = jsonify(export_chrome_trace())
+    response.headers['Content-Disposition'] = 'attachment; filename=rover-trace.json'
+    return response
+
+# Run the sampling profiler over all threads for N seconds
+@app.route('/debug/profile/<int:seconds>', methods=['GET'])
+def debug_profile(seconds):
+    global profiler_thread
+    if profiler_thread is not None and profiler_thread.is_alive():
+        return jsonify({'status': 'error', 'message': 'profiler already running'}), 409
+    seconds = max(1, min(PROFILE_MAX_SECONDS, seconds))
+    profiler_stop.clear()
+    profiler_thread = threading.Thread(target=profile_sampler, args=(seconds,), name='profiler', daemon=True)
+    profiler_thread.start()
+    return jsonify({'status': 'success', 'profiling_seconds': seconds})
+
+@app.route('/debug/profile/stop', methods=['GET'])
+def debug_profile_stop():
+    profiler_stop.set()
+    return jsonify({'status': 'success', 'events': len(trace_events)})
+
 # --------------------- HTML Content ---------------------
 HTML = """
 <!DOCTYPE html>
@@ -501,6 +1823,25 @@ HTML = """
             background-color: #c0392b;
         }
 
+        .spectrum-panel {
+            margin-top: 30px;
+        }
+
+        .spectrum-canvas {
+            width: 100%;
+            height: 200px;
+            background-color: #000;
+            border-radius: var(--border-radius);
+            image-rendering: pixelated;
+        }
+
+        .spectrum-axis {
+            display: flex;
+            justify-content: space-between;
+            font-size: 0.9rem;
+            color: #666;
+        }
+
         .anomaly-alert {
             display: none;
             background-color: var(--alert-color);
@@ -522,6 +1863,13 @@ HTML = """
             display: block;
         }
 
+        body.viewer .control-grid,
+        body.viewer .slider-container,
+        body.viewer .keyboard-control,
+        body.viewer .stop-button {
+            display: none;
+        }
+
         @media (hover: none) {
             .button {
                 padding: 20px;
@@ -556,10 +1904,14 @@ HTML = """
         }
     </style>
 </head>
-<body>
+<body{% if viewer %} class="viewer"{% endif %}>
     <header>
         <h1>Robot Control Center</h1>
+        {% if viewer %}
+        <p class="subtitle">Read-only view of robot status and arm position</p>
+        {% else %}
         <p class="subtitle">Remote interface for robot car and robotic arm operations</p>
+        {% endif %}
     </header>
 
     <div class="anomaly-alert" id="anomalyAlert">
@@ -729,12 +2081,25 @@ HTML = """
         </section>
     </main>
 
+    <section class="control-panel spectrum-panel">
+        <div class="panel-header">
+            <h2 class="panel-title"><i class="fas fa-wave-square"></i> Vibration Spectrum</h2>
+        </div>
+        <canvas class="spectrum-canvas" id="spectrumCanvas" width="64" height="200"></canvas>
+        <div class="spectrum-axis">
+            <span>0 Hz</span>
+            <span>{{ max_freq | round(1) }} Hz</span>
+        </div>
+    </section>
+
     <button class="stop-button" onclick="emergencyStop()">
         <i class="fas fa-exclamation-triangle"></i> EMERGENCY STOP
     </button>
 
     <script>
         const raspberryPiIP = window.location.origin;
+        const viewerMode = {{ 'true' if viewer else 'false' }};
+        const telemetryMaxHz = 5;
         let commandInterval = null;
         let currentCommand = null;
         let anomalyCheckInterval = null;
@@ -746,7 +2111,10 @@ HTML = """
         };
 
         function sendCommand(command) {
-            fetch(${raspberryPiIP}/control/${command}, {
+            if (viewerMode) {
+                return;
+            }
+            fetch(`${raspberryPiIP}/control/${command}`, {
                 method: 'GET',
             })
             .then(response => response.json())
@@ -794,42 +2162,69 @@ HTML = """
 
         function updateArmPositions(positions) {
             armPositions = positions;
-            document.getElementById("base-position").textContent = ${positions.base}°;
-            document.getElementById("elbow-position").textContent = ${positions.elbow}°;
-            document.getElementById("gripper-position").textContent = ${positions.gripper}°;
-            document.getElementById("base-indicator").style.width = ${(positions.base / 180) * 100}%;
-            document.getElementById("elbow-indicator").style.width = ${(positions.elbow / 180) * 100}%;
-            document.getElementById("gripper-indicator").style.width = ${(positions.gripper / 90) * 100}%;
+            document.getElementById("base-position").textContent = `${positions.base}°`;
+            document.getElementById("elbow-position").textContent = `${positions.elbow}°`;
+            document.getElementById("gripper-position").textContent = `${positions.gripper}°`;
+            document.getElementById("base-indicator").style.width = `${(positions.base / 180) * 100}%`;
+            document.getElementById("elbow-indicator").style.width = `${(positions.elbow / 180) * 100}%`;
+            document.getElementById("gripper-indicator").style.width = `${(positions.gripper / 90) * 100}%`;
+        }
+
+        function applyTelemetry(data) {
+            if (data.anomaly_detected) {
+                document.getElementById("anomalyAlert").classList.add("active");
+                document.getElementById("peakMagnitude").textContent = data.peak_magnitude;
+                document.body.classList.add("alert");
+            } else {
+                document.getElementById("anomalyAlert").classList.remove("active");
+                document.body.classList.remove("alert");
+            }
+            if (data.positions) {
+                updateArmPositions(data.positions);
+            }
         }
 
         function checkForAnomalies() {
-            fetch(${raspberryPiIP}/check_anomaly, {
+            fetch(`${raspberryPiIP}/check_anomaly`, {
                 method: 'GET',
             })
             .then(response => response.json())
-            .then(data => {
-                if (data.anomaly_detected) {
-                    document.getElementById("anomalyAlert").classList.add("active");
-                    document.getElementById("peakMagnitude").textContent = data.peak_magnitude;
-                    document.body.classList.add("alert");
-                } else {
-                    document.getElementById("anomalyAlert").classList.remove("active");
-                    document.body.classList.remove("alert");
-                }
-            })
+            .then(applyTelemetry)
             .catch(error => console.error('Error checking anomalies:', error));
         }
 
+        function startPolling() {
+            if (!anomalyCheckInterval) {
+                anomalyCheckInterval = setInterval(checkForAnomalies, 1000);
+                checkForAnomalies();
+            }
+        }
+
+        // Subscribe to the shared telemetry stream; poll only without EventSource
+        function startTelemetry() {
+            if (!window.EventSource) {
+                startPolling();
+                return;
+            }
+            const stream = new EventSource(`${raspberryPiIP}/telemetry/stream?max_hz=${telemetryMaxHz}`);
+            stream.onmessage = event => applyTelemetry(JSON.parse(event.data));
+            stream.onerror = () => {
+                if (stream.readyState === EventSource.CLOSED) {
+                    startPolling();
+                }
+            };
+        }
+
         const speedSlider = document.getElementById("speedSlider");
         const speedValue = document.getElementById("speedValue");
         
         speedSlider.oninput = function() {
             speedValue.textContent = this.value + "%";
-            sendCommand(speed-${this.value});
+            sendCommand(`speed-${this.value}`);
         }
 
         document.addEventListener('keydown', function(event) {
-            if (!currentCommand) {
+            if (!currentCommand && !viewerMode) {
                 switch(event.key.toLowerCase()) {
                     case 'w': startCommand('w'); break;
                     case 's': startCommand('s'); break;
@@ -868,29 +2263,112 @@ HTML = """
             }
         });
 
-        anomalyCheckInterval = setInterval(checkForAnomalies, 1000);
-        checkForAnomalies();
+        // Vibration spectrum waterfall fed by binary frames (see /spectrum/stream)
+        const spectrumHz = 5;
+        const spectrumBins = 64;
+
+        function drawSpectrumRow(levels, scale) {
+            const canvas = document.getElementById("spectrumCanvas");
+            const ctx = canvas.getContext("2d");
+            if (canvas.width !== levels.length) {
+                canvas.width = levels.length;
+            }
+            // Scroll the waterfall up one row and paint the newest at the bottom
+            ctx.drawImage(canvas, 0, 1, canvas.width, canvas.height - 1, 0, 0, canvas.width, canvas.height - 1);
+            const row = ctx.createImageData(canvas.width, 1);
+            for (let i = 0; i < levels.length; i++) {
+                const level = Math.sqrt(Math.min(1, levels[i] / scale));
+                row.data[i * 4] = Math.round(255 * Math.min(1, level * 2));
+                row.data[i * 4 + 1] = Math.round(255 * Math.max(0, level * 2 - 1));
+                row.data[i * 4 + 2] = Math.round(255 * (1 - level) * level * 2);
+                row.data[i * 4 + 3] = 255;
+            }
+            ctx.putImageData(row, 0, canvas.height - 1);
+        }
+
+        function handleSpectrumFrame(frame) {
+            const view = new DataView(frame.buffer, frame.byteOffset, frame.byteLength);
+            const scale = view.getFloat32(8, true);
+            const bins = view.getUint16(12, true);
+            const format = view.getUint8(14);
+            if (bins === 0) {
+                return;
+            }
+            if (format === 1) {
+                drawSpectrumRow(frame.subarray(16, 16 + bins), 255);
+            } else {
+                drawSpectrumRow(new Float32Array(frame.slice(16, 16 + bins * 4).buffer), {{ spectrum_full_scale }});
+            }
+        }
+
+        async function startSpectrum() {
+            if (!window.fetch || !window.ReadableStream) {
+                return;
+            }
+            try {
+                const response = await fetch(`${raspberryPiIP}/spectrum/stream?hz=${spectrumHz}&bins=${spectrumBins}&format=u8`);
+                const reader = response.body.getReader();
+                let pending = new Uint8Array(0);
+                while (true) {
+                    const { value, done } = await reader.read();
+                    if (done) {
+                        break;
+                    }
+                    const joined = new Uint8Array(pending.length + value.length);
+                    joined.set(pending);
+                    joined.set(value, pending.length);
+                    pending = joined;
+                    while (pending.length >= 4) {
+                        const length = new DataView(pending.buffer, pending.byteOffset, 4).getUint32(0, true);
+                        if (pending.length < length) {
+                            break;
+                        }
+                        handleSpectrumFrame(pending.subarray(0, length));
+                        pending = pending.subarray(length);
+                    }
+                }
+            } catch (error) {
+                console.error('Spectrum stream error:', error);
+            }
+            setTimeout(startSpectrum, 2000);
+        }
+
+        startTelemetry();
+        startSpectrum();
     </script>
 </body>
 </html>
 """
 
 # --------------------- Main Application Entry ---------------------
-if _name_ == "_main_":
+if __name__ == "__main__":
     try:
+        if REALTIME:
+            start_realtime_profile()
+
+        # Bring up the buses in the background so the server accepts
+        # connections while slower devices finish initializing
+        startup_thread = threading.Thread(target=init_hardware, name='startup', daemon=True)
+        startup_thread.start()
+
         # Start the vibration analysis in a separate thread
-        vibration_thread = threading.Thread(target=vibration_analysis, daemon=True)
+        vibration_thread = threading.Thread(target=vibration_analysis, name='vibration', daemon=True)
         vibration_thread.start()
         
-        # Initialize servo positions
-        base.angle = base_angle
-        elbow.angle = elbow_angle
-        gripper.angle = gripper_angle
-        
         # Start Flask server
-        app.run(host='0.0.0.0', port=5000, debug=False)
+        app.run(host='0.0.0.0', port=int(os.environ.get('ROVER_PORT', 5000)), debug=False)
     finally:
-        # Clean up GPIO on exit
-        GPIO.cleanup()
-        pca.deinit()
-        spi.close()
+        # Clean up only the devices that were actually opened
+        if GPIO.is_ready():
+            GPIO.cleanup()
+        if pca.is_ready():
+            pca.deinit()
+        if spi.is_ready():
+            spi.close()
+        # A simulated run's default database is scratch data
+        if HISTORY_DB == HISTORY_DB_DEFAULT and SIMULATE_HARDWARE:
+            for suffix in ('', '-wal', '-shm'):
+                try:
+                    os.remove(HISTORY_DB + suffix)
+                except OSError:
+                    pass
@@ -0,0 +1,111 @@
+# Simulated stand-ins for the rover's hardware drivers. rover.py uses these
+# instead of RPi.GPIO, spidev and the Adafruit PCA9685 stack when it runs with
+# ROVER_SIMULATE=1, so the Flask app can be exercised on any machine
+import random
+import time
+import urllib.request
+
+I2C_WRITE_TIME = 0.0003  # One PCA9685 register write at 100 kHz (s)
+SPI_NOISE = 40  # Std-dev of simulated ADXL345 readings (raw counts)
+
+# --------------------- GPIO ---------------------
+class SimulatedPWM:
+    def __init__(self, pin, frequency):
+        self.pin = pin
+        self.frequency = frequency
+        self.duty_cycle = 0
+
+    def start(self, duty_cycle):
+        self.duty_cycle = duty_cycle
+
+    def ChangeDutyCycle(self, duty_cycle):
+        self.duty_cycle = duty_cycle
+
+    def stop(self):
+        self.duty_cycle = 0
+
+# Mirrors the RPi.GPIO module interface the rover uses
+class SimulatedGPIO:
+    BCM = 11
+    OUT = 0
+    LOW = 0
+    HIGH = 1
+
+    def __init__(self):
+        self.mode = None
+        self.pins = {}
+
+    def setmode(self, mode):
+        self.mode = mode
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin, direction):
+        self.pins[pin] = self.LOW
+
+    def output(self, pin, value):
+        self.pins[pin] = value
+
+    def PWM(self, pin, frequency):
+        return SimulatedPWM(pin, frequency)
+
+    def cleanup(self):
+        self.pins.clear()
+
+GPIO = SimulatedGPIO()
+
+# --------------------- SPI (ADXL345) ---------------------
+class SimulatedSpiDev:
+    def __init__(self):
+        self.max_speed_hz = 0
+        self.mode = 0
+
+    def open(self, bus, device):
+        self.bus = bus
+        self.device = device
+
+    def xfer2(self, data):
+        # Reads (bit 7 set) return a noisy little-endian 16-bit sample
+        if data[0] & 0x80:
+            value = int(random.gauss(0, SPI_NOISE)) & 0xFFFF
+            return [0, value & 0xFF, value >> 8]
+        return [0] * len(data)
+
+    def close(self):
+        pass
+
+# --------------------- I2C (PCA9685) ---------------------
+class SimulatedPCA9685:
+    def __init__(self):
+        self.frequency = 0
+        self.channels = list(range(16))
+
+    def deinit(self):
+        pass
+
+class SimulatedServo:
+    def __init__(self, channel):
+        self.channel = channel
+        self._angle = None
+
+    @property
+    def angle(self):
+        return self._angle
+
+    @angle.setter
+    def angle(self, value):
+        time.sleep(I2C_WRITE_TIME)
+        self._angle = value
+
+# --------------------- Simulated Rover Processes ---------------------
+# Used by loadtest.py and gateway.py, which run rover.py as subprocesses
+def wait_until_up(url, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"{url}/status/hardware", timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
@@ -0,0 +1,52 @@
+# Checks for macro waypoint validation and simplification; pure NumPy, runs on simulated hardware
+#
+#   python -m pytest test_macros.py
+import os
+
+os.environ.setdefault('ROVER_SIMULATE', '1')
+
+import numpy as np
+import pytest
+import rover
+
+def test_dwell_is_held_until_next_move():
+    # Base steps 90 -> 100, pauses for 2 s, then steps on to 110
+    points = np.array([
+        [0.0, 90, 90, 0],
+        [0.2, 95, 90, 0],
+        [0.4, 100, 90, 0],
+        [2.4, 105, 90, 0],
+        [2.6, 110, 90, 0]
+    ], dtype=float)
+    kept = rover.simplify_waypoints(points)
+    assert kept[:, 1].tolist() == [90, 100, 100, 110]
+    assert kept[1, 0] == 0.4
+    assert 0.4 < kept[2, 0] < 2.4
+
+    samples, _ = rover.compile_trajectory(points.tolist())
+    t = np.arange(len(samples)) * rover.SERVO_TICK
+    paused = samples[(t > 0.5) & (t < 2.3), 0]
+    assert paused.min() == paused.max() == 100
+    assert samples[-1].tolist() == [110, 90, 0]
+
+def test_continuous_motion_keeps_endpoints_only():
+    points = np.array([[0.2 * i, 90 + 5 * i, 90, 0] for i in range(6)], dtype=float)
+    kept = rover.simplify_waypoints(points)
+    assert kept.tolist() == [points[0].tolist(), points[-1].tolist()]
+
+def test_reversal_is_kept():
+    points = np.array([[0.0, 90, 90, 0], [0.2, 95, 90, 0], [0.4, 90, 90, 0]], dtype=float)
+    assert rover.simplify_waypoints(points).tolist() == points.tolist()
+
+def test_invalid_waypoints_are_rejected():
+    bad = [
+        [[0, 1, 2, 3], [1, 2, 3, 1e9]],  # gripper out of range
+        [[-5, 100, 2, 3], [1, 100, 2, 3]],  # negative time
+        [[0, 90, 90, 0], [2, 95, 90, 0], [1, 100, 90, 0]],  # time goes backwards
+        [[0, 90, 90, 0], [1, float('nan'), 90, 0]],
+        [[0, 90, 90]],
+        [[0, 90, 90, 0], [rover.MACRO_MAX_DURATION + 1, 95, 90, 0]]
+    ]
+    for waypoints in bad:
+        with pytest.raises(ValueError):
+            rover.compile_trajectory(waypoints)